@@ -0,0 +1,291 @@
+"""
+Columnar analytics snapshots of the database, queried with DuckDB.
+
+A nightly export copies the live SQLite database with the online backup API (one
+short read lock), then writes OccupancyLog, Slot, Unit and Room from the copy as
+Parquet, partitioned by month for the log and slot tables. Admin SQL queries run
+on an in-memory DuckDB over the latest snapshot, never on database.db.
+
+CLI (from the server directory):
+    python analytics_routes.py export
+    python analytics_routes.py query "SELECT month, count(*) FROM occupancy_log GROUP BY month"
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Annotated, Any
+
+import duckdb
+import pyarrow as pa
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session
+
+from models import User, UserType
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+ANALYTICS_DIR = Path(os.environ.get("FOMO_ANALYTICS_DIR", "analytics"))
+# Snapshots kept on disk, newest first
+KEEP_SNAPSHOTS = 3
+# A snapshot younger than this is not re-exported by the nightly task
+SNAPSHOT_MAX_AGE = timedelta(hours=20)
+EXPORT_CHUNK_ROWS = 100_000
+MAX_QUERY_ROWS = 10_000
+
+# View name: (SQLite table, column partitioned by month or None)
+SNAPSHOT_TABLES = {
+    "occupancy_log": ("occupancylog", "timestamp"),
+    "slot": ("slot", "start"),
+    "unit": ("unit", None),
+    "room": ("room", None),
+}
+
+# SQLite declared type: (Arrow type read from SQLite, DuckDB type written)
+COLUMN_TYPES = {
+    "INTEGER": (pa.int64(), "BIGINT"),
+    "BOOLEAN": (pa.int64(), "BOOLEAN"),
+    "DATETIME": (pa.string(), "TIMESTAMP"),
+    "VARCHAR": (pa.string(), "VARCHAR"),
+}
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+def snapshots(analytics_dir: Path = ANALYTICS_DIR) -> list[Path]:
+    """Complete snapshots, newest first"""
+    if not analytics_dir.exists():
+        return []
+    return sorted(analytics_dir.glob("snapshot-*"), reverse=True)
+
+
+def snapshot_time(snapshot: Path) -> datetime:
+    return datetime.strptime(snapshot.name, "snapshot-%Y%m%dT%H%M%S")
+
+
+def read_batches(connection: sqlite3.Connection, table: str):
+    """Stream a SQLite table as Arrow record batches, with its DuckDB column types"""
+    columns = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+    names = [column[1] for column in columns]
+    types = [
+        COLUMN_TYPES.get(column[2].upper(), COLUMN_TYPES["VARCHAR"])
+        for column in columns
+    ]
+    schema = pa.schema([(name, arrow) for name, (arrow, _) in zip(names, types)])
+
+    def batches():
+        quoted = ", ".join(f'"{name}"' for name in names)
+        cursor = connection.execute(f'SELECT {quoted} FROM "{table}"')
+        while rows := cursor.fetchmany(EXPORT_CHUNK_ROWS):
+            yield pa.RecordBatch.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(zip(*rows), schema)
+                ],
+                schema=schema,
+            )
+
+    reader = pa.RecordBatchReader.from_batches(schema, batches())
+    return reader, {name: duckdb_type for name, (_, duckdb_type) in zip(names, types)}
+
+
+def export_table(
+    olap: duckdb.DuckDBPyConnection,
+    copy: sqlite3.Connection,
+    table: str,
+    partition_column: str | None,
+    target: Path,
+):
+    reader, types = read_batches(copy, table)
+    olap.register("source", reader)
+    columns = [
+        f'CAST("{name}" AS {duckdb_type}) AS "{name}"'
+        for name, duckdb_type in types.items()
+    ]
+    (count,) = copy.execute(f'SELECT count(*) FROM "{table}"').fetchone()
+    if partition_column is None or not count:
+        # Empty tables still get a file, so their views keep a schema
+        if partition_column is not None:
+            target = target / "month=none"
+        target.mkdir(parents=True)
+        options = ""
+        target = target / "data.parquet"
+    else:
+        month = f'CAST("{partition_column}" AS TIMESTAMP)'
+        columns.append(f"strftime({month}, '%Y-%m') AS month")
+        options = ", PARTITION_BY (month)"
+    olap.execute(
+        f"COPY (SELECT {', '.join(columns)} FROM source) "
+        f"TO '{target}' (FORMAT parquet{options})"
+    )
+    olap.unregister("source")
+
+
+def export_snapshot(database_path: str, analytics_dir: Path = ANALYTICS_DIR) -> Path:
+    """Export the analytics tables of a SQLite database to a new Parquet snapshot"""
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    staging = analytics_dir / f".staging-{stamp}"
+    staging.mkdir(parents=True)
+
+    try:
+        # Copy first, so the export never holds a lock on the live database
+        source_copy = staging / "source.db"
+        uri = f"file:{database_path}?mode=ro"
+        with closing(sqlite3.connect(uri, uri=True)) as source:
+            with closing(sqlite3.connect(source_copy)) as copy:
+                source.backup(copy)
+
+        # DuckDB pulls the Arrow batches from its own threads
+        with closing(sqlite3.connect(source_copy, check_same_thread=False)) as copy:
+            with duckdb.connect() as olap:
+                for view, (table, partition_column) in SNAPSHOT_TABLES.items():
+                    export_table(olap, copy, table, partition_column, staging / view)
+        source_copy.unlink()
+    except Exception:
+        shutil.rmtree(staging)
+        raise
+
+    snapshot = analytics_dir / f"snapshot-{stamp}"
+    staging.rename(snapshot)
+    for old in snapshots(analytics_dir)[KEEP_SNAPSHOTS:]:
+        shutil.rmtree(old)
+    print(f"Analytics snapshot exported to {snapshot}")
+    return snapshot
+
+
+def export_if_stale(database_path: str, analytics_dir: Path = ANALYTICS_DIR):
+    """Nightly task: export unless a recent snapshot already exists (e.g. after a restart)"""
+    existing = snapshots(analytics_dir)
+    if existing and datetime.now() - snapshot_time(existing[0]) < SNAPSHOT_MAX_AGE:
+        return
+    export_snapshot(database_path, analytics_dir)
+
+
+def connect_snapshot(snapshot: Path) -> duckdb.DuckDBPyConnection:
+    """In-memory DuckDB with one view per snapshot table, unable to touch other files"""
+    olap = duckdb.connect()
+    for view, (_, partition_column) in SNAPSHOT_TABLES.items():
+        if partition_column is None:
+            source = f"read_parquet('{snapshot / view / 'data.parquet'}')"
+        else:
+            source = (
+                f"read_parquet('{snapshot / view / '**' / '*.parquet'}', "
+                "hive_partitioning = true)"
+            )
+        olap.execute(f'CREATE VIEW "{view}" AS SELECT * FROM {source}')
+    olap.execute(f"SET allowed_directories = ['{snapshot}/']")
+    olap.execute("SET enable_external_access = false")
+    olap.execute("SET lock_configuration = true")
+    return olap
+
+
+def query_snapshot(
+    sql: str, limit: int = MAX_QUERY_ROWS, analytics_dir: Path = ANALYTICS_DIR
+) -> tuple[Path, list[str], list[tuple[Any, ...]]]:
+    """Run one read-only SELECT over the latest snapshot"""
+    existing = snapshots(analytics_dir)
+    if not existing:
+        raise LookupError("No analytics snapshot has been exported yet")
+
+    olap = connect_snapshot(existing[0])
+    try:
+        statements = olap.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only a single SELECT statement is allowed")
+        result = olap.execute(sql)
+        columns = [column[0] for column in result.description]
+        return existing[0], columns, result.fetchmany(limit)
+    finally:
+        olap.close()
+
+
+def require_admin(session: Session, user_id: int):
+    user = session.get(User, user_id)
+    if not user or user.user_type != UserType.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+class AnalyticsQuery(BaseModel):
+    sql: str
+
+
+class AnalyticsResult(BaseModel):
+    snapshot: str
+    snapshot_time: datetime
+    columns: list[str]
+    rows: list[list[Any]]
+    truncated: bool
+
+
+@router.post("/query", response_model=AnalyticsResult)
+def run_query(
+    query: AnalyticsQuery,
+    user_id: Annotated[int, Query()],
+    limit: Annotated[int, Query(ge=1, le=MAX_QUERY_ROWS)] = 1000,
+    session: Session = SessionDep,
+):
+    """Run a read-only SQL query over the latest analytics snapshot (admins only)"""
+    require_admin(session, user_id)
+    try:
+        snapshot, columns, rows = query_snapshot(query.sql, limit + 1)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, duckdb.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AnalyticsResult(
+        snapshot=snapshot.name,
+        snapshot_time=snapshot_time(snapshot),
+        columns=columns,
+        rows=[list(row) for row in rows[:limit]],
+        truncated=len(rows) > limit,
+    )
+
+
+@router.post("/snapshot")
+def create_snapshot(
+    user_id: Annotated[int, Query()],
+    session: Session = SessionDep,
+):
+    """Export a new analytics snapshot now (admins only)"""
+    from main import sqlite_file_name
+
+    require_admin(session, user_id)
+    snapshot = export_snapshot(sqlite_file_name)
+    return {"snapshot": snapshot.name, "snapshot_time": snapshot_time(snapshot)}
+
+
+def run_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="export a snapshot of the database")
+    query = commands.add_parser("query", help="run SQL over the latest snapshot")
+    query.add_argument("sql")
+    query.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(os.environ.get("FOMO_DATABASE", "database.db"))
+        return
+
+    snapshot, columns, rows = query_snapshot(args.sql, args.limit)
+    print(f"-- {snapshot.name}")
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    run_cli()
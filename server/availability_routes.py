@@ -0,0 +1,200 @@
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from models import Room
+
+router = APIRouter(prefix="/availability", tags=["availability"])
+
+# How long a room stays busy after an occupied reading without a newer one
+LIVE_OCCUPANCY_TTL = timedelta(minutes=10)
+# Days of reservations (starting today) held in the index
+INDEX_HORIZON_DAYS = 2
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class RoomIntervals:
+    """
+    Busy spans of one room: merged reserved intervals plus the live occupancy.
+
+    Reserved intervals are kept sorted and non-overlapping, so the interval
+    containing or following an instant is found with one binary search.
+    """
+
+    def __init__(
+        self, name: str, building: str, reserved: list[tuple[datetime, datetime]]
+    ):
+        self.name = name
+        self.building = building
+        self.starts: list[datetime] = []
+        self.ends: list[datetime] = []
+        for start, end in sorted(reserved):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+        self.last_reading: datetime | None = None
+        self.occupied_until: datetime | None = None
+
+    def record_occupancy(self, timestamp: datetime, occupied: bool):
+        """Track the live state from the room's latest (effective) reading"""
+        if self.last_reading is not None and timestamp < self.last_reading:
+            return
+        self.last_reading = timestamp
+        self.occupied_until = timestamp + LIVE_OCCUPANCY_TTL if occupied else None
+
+    def is_reserved(self, at: datetime) -> bool:
+        i = bisect_right(self.ends, at)
+        return i < len(self.starts) and self.starts[i] <= at
+
+    def free_until(self, at: datetime, closing: datetime) -> datetime | None:
+        """When the room stops being free, or None if it is busy at `at`"""
+        if self.occupied_until is not None:
+            if self.last_reading <= at < self.occupied_until:
+                return None
+        i = bisect_right(self.ends, at)
+        if i < len(self.starts):
+            if self.starts[i] <= at:
+                return None
+            return min(self.starts[i], closing)
+        return closing
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.rooms: dict[int, RoomIntervals] = {}
+        # [start, end) of the reservations held, empty until the first rebuild
+        self.start = self.end = datetime.min
+
+    def rebuild(
+        self,
+        rooms: list[tuple[int, str, str]],
+        reserved: list[tuple[int, datetime, datetime]],
+        start: datetime,
+        end: datetime,
+    ):
+        """
+        Replace the index from (room_id, name, building) rooms and the reserved slot
+        rows overlapping [start, end)
+        """
+        spans: dict[int, list[tuple[datetime, datetime]]] = {
+            room_id: [] for room_id, _, _ in rooms
+        }
+        for room_id, start, end in reserved:
+            if room_id in spans:
+                spans[room_id].append((start, end))
+
+        rebuilt = {
+            room_id: RoomIntervals(name, building, spans[room_id])
+            for room_id, name, building in rooms
+        }
+        # Keep the live state, which only /sync knows about
+        for room_id, intervals in rebuilt.items():
+            previous = self.rooms.get(room_id)
+            if previous is not None:
+                intervals.last_reading = previous.last_reading
+                intervals.occupied_until = previous.occupied_until
+        self.rooms = rebuilt
+        self.start, self.end = start, end
+
+    def covers(self, at: datetime) -> bool:
+        return self.start <= at < self.end
+
+    def record_occupancy(self, room_id: int, timestamp: datetime, occupied: bool):
+        intervals = self.rooms.get(room_id)
+        if intervals is not None:
+            intervals.record_occupancy(timestamp, occupied)
+
+    def is_reserved(self, room_id: int, at: datetime) -> bool:
+        intervals = self.rooms.get(room_id)
+        return intervals is not None and intervals.is_reserved(at)
+
+    def find_free(
+        self, at: datetime, duration: timedelta
+    ) -> list[tuple[int, str, datetime]]:
+        """
+        Rooms free from `at` for at least `duration`, longest free first.
+
+        Rooms in buildings that are closed at `at` are never free; otherwise a room
+        is free until its building closes at the latest, or the end of the index.
+        """
+        from main import get_closing_time, is_currently_open
+
+        free = []
+        for room_id, intervals in self.rooms.items():
+            if not is_currently_open(at, intervals.building):
+                continue
+            closing = min(get_closing_time(at, intervals.building), self.end)
+            until = intervals.free_until(at, closing)
+            if until is not None and until - at >= duration:
+                free.append((room_id, intervals.name, until))
+        free.sort(key=lambda room: room[2], reverse=True)
+        return free
+
+
+index = AvailabilityIndex()
+
+
+def rebuild_index(session: Session):
+    """Rebuild the availability index from the rooms and upcoming reserved slots"""
+    from main import Slot
+
+    today = datetime.combine(date.today(), datetime.min.time())
+    horizon = today + timedelta(days=INDEX_HORIZON_DAYS)
+    rooms = session.exec(select(Room.id, Room.name, Room.building)).all()
+    statement = select(Slot.itemId, Slot.start, Slot.end).where(
+        Slot.reserved == True,
+        Slot.end > today,
+        Slot.start < horizon,
+    )
+    index.rebuild(rooms, session.exec(statement).all(), today, horizon)
+
+
+class FreeRoom(BaseModel):
+    room_id: int
+    room_name: str
+    free_until: datetime
+    free_minutes: int
+
+
+@router.get("/free", response_model=list[FreeRoom])
+async def find_free_rooms(
+    duration: Annotated[int, Query(ge=0, description="Minutes")] = 30,
+    at: Annotated[datetime | None, Query()] = None,
+):
+    """
+    Find rooms that are neither reserved nor occupied from `at` (default now) for
+    at least `duration` minutes, ranked by how long they stay free. Only the next
+    INDEX_HORIZON_DAYS days (starting today) can be searched.
+    """
+    if at is None:
+        at = datetime.now()
+    if not index.covers(at):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Availability is only known from {index.start} to {index.end}",
+        )
+
+    return [
+        FreeRoom(
+            room_id=room_id,
+            room_name=name,
+            free_until=until,
+            free_minutes=int((until - at).total_seconds() // 60),
+        )
+        for room_id, name, until in index.find_free(at, timedelta(minutes=duration))
+    ]
@@ -0,0 +1,83 @@
+"""
+Backtest the occupancy forecaster against stored slot history.
+
+Fits on everything before the holdout period and scores the predicted occupancy
+probability of every slot in the holdout period (Brier score and accuracy),
+next to a baseline that only knows the overall reserved/unreserved rates. Also
+times a forecast for every room.
+
+Usage (from the server directory, uses FOMO_DATABASE or database.db):
+    python benchmarks/backtest_forecast.py [--holdout-weeks 2]
+"""
+
+import argparse
+import sys
+import timeit
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from sqlmodel import Session, select
+
+from forecast_routes import SLOTS_PER_DAY, OccupancyForecaster
+from main import Slot, create_db_and_tables, engine
+
+
+def score(probabilities: np.ndarray, outcomes: np.ndarray) -> tuple[float, float]:
+    brier = float(np.mean((probabilities - outcomes) ** 2))
+    accuracy = float(np.mean((probabilities >= 0.5) == outcomes))
+    return brier, accuracy
+
+
+def run_backtest():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--holdout-weeks", type=int, default=2)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        statement = select(Slot.itemId, Slot.start, Slot.reserved, Slot.occupied)
+        rows = session.exec(statement.order_by(Slot.start)).all()
+    if not rows:
+        print("No slots in the database, nothing to backtest")
+        return
+
+    cutoff = rows[-1][1] - timedelta(weeks=args.holdout_weeks)
+    history = [row for row in rows if row[1] < cutoff]
+    holdout = [row for row in rows if row[1] >= cutoff]
+    if not history or not holdout:
+        print("Not enough history before the holdout period")
+        return
+
+    forecaster = OccupancyForecaster()
+    forecaster.fit(history)
+
+    predictions = []
+    baseline = []
+    for room_id, start, reserved, _ in holdout:
+        grid = np.zeros((1, SLOTS_PER_DAY), dtype=bool)
+        grid[0, :] = reserved
+        slot = (start.hour * 60 + start.minute) // 30
+        predictions.append(forecaster.predict([room_id], start.date(), grid)[0, slot])
+        baseline.append(forecaster.prior[int(reserved)])
+    outcomes = np.array([row[3] for row in holdout], dtype=np.float64)
+
+    print(f"Trained on {len(history)} slots, scored {len(holdout)} after {cutoff}")
+    print(f"{'model':<12}{'brier':>8}{'accuracy':>10}")
+    for name, probabilities in (("forecast", predictions), ("baseline", baseline)):
+        brier, accuracy = score(np.array(probabilities), outcomes)
+        print(f"{name:<12}{brier:>8.4f}{accuracy:>10.2%}")
+
+    room_ids = sorted({row[0] for row in rows})
+    grid = np.zeros((len(room_ids), SLOTS_PER_DAY), dtype=bool)
+    day = rows[-1][1].date()
+    seconds = min(
+        timeit.repeat(lambda: forecaster.predict(room_ids, day, grid), number=1000)
+    )
+    print(f"Forecast for {len(room_ids)} rooms: {seconds * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    run_backtest()
@@ -0,0 +1,279 @@
+"""
+Benchmark the room analytics on synthetic data against a saved baseline.
+
+Times calculate_occupancy_percentage and compute_average_study_session_duration
+on the logs of every room, and the full GET /stats/{room_id} of every room
+through the test client, over ranges from one to six months (data from
+synthetic_data, in a throwaway database). Each case is compared with the saved
+baseline; the run fails (exit status 1) if a case got slower than its tolerance
+allows. Baselines are machine specific: save one on the machine the comparisons
+run on.
+
+Each case is timed as the median of REPEATS repeats. Its tolerance is the larger
+of --tolerance and NOISE_MARGIN times the interquartile range of its repeats when
+the baseline was saved (the median of BASELINE_RUNS runs), so cases depending on SQLite and the ORM, which vary more
+between runs, get a wider one.
+
+The time per reading of every case is also compared across range lengths: a
+case whose time grows faster than MAX_SCALING (the exponent of time against
+readings) fails the run, and no baseline is saved, so a superlinear path cannot
+hide in the baseline. Ranges less than MIN_SCALING_RATIO times longer than the
+shortest are too close for the exponent to stand out from noise, and are only
+reported.
+
+Usage (from the server directory):
+    python benchmarks/bench_analytics.py [--days 30 90 180] [--tolerance 0.5]
+    python benchmarks/bench_analytics.py --save-baseline
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["FOMO_DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import main
+from main import OccupancyLog, Room, Slot
+from synthetic_data import SyntheticCampus
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "bench_analytics.json"
+DAYS = [30, 90, 180]
+ROOMS = 4
+# Sensor cadence of the synthetic units, keeping six months of four rooms quick to
+# generate
+READING_INTERVAL = timedelta(minutes=5)
+REPEATS = 15
+# Runs a saved baseline is the median of, so one noisy stretch does not skew it
+BASELINE_RUNS = 3
+# Relative slowdown over the baseline reported as a regression, at least
+TOLERANCE = 0.5
+# Multiple of a case's relative interquartile range added to its tolerance
+NOISE_MARGIN = 4
+# Exponent of time against readings above which a case is reported as
+# superlinear: 1.0 for linear and 2.0 for quadratic scaling
+MAX_SCALING = 1.5
+# Readings ratio from the shortest range needed to check the exponent: with
+# timings off by up to ~50% between runs, it is off by up to ~0.3 at 4x
+MIN_SCALING_RATIO = 4
+
+
+def fill_database(campus: SyntheticCampus) -> list[dict]:
+    """Insert the campus and return its logs"""
+    main.create_db_and_tables()
+    slots, logs = campus.generate()
+    with Session(main.engine) as session:
+        session.execute(insert(Room), campus.rooms())
+        session.execute(insert(Slot), slots)
+        session.execute(insert(OccupancyLog), logs)
+        session.commit()
+    return logs
+
+
+def measure(func) -> tuple[float, float]:
+    """
+    Median time of one call in seconds and the relative interquartile range of the
+    repeats, fast calls being repeated for 0.2s per repeat
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [time / number for time in timer.repeat(repeat=REPEATS, number=number)]
+    median = statistics.median(times)
+    quartiles = statistics.quantiles(times, n=4)
+    return median, (quartiles[2] - quartiles[0]) / median
+
+
+def run_cases(campus: SyntheticCampus, logs: list[dict], days: list[int]) -> dict:
+    """
+    Case name -> (readings in range, median seconds, relative spread), each case
+    covering every room
+    """
+    room_logs = {
+        room_id: [OccupancyLog(**log) for log in logs if log["itemId"] == room_id]
+        for room_id in campus.room_ids
+    }
+    hours = main.opening_hours.calendar.for_building("Webster")
+    client = TestClient(main.app)
+
+    results = {}
+    for length in days:
+        start = campus.start
+        end = start + timedelta(days=length)
+        in_range = {
+            room_id: [log for log in room if start <= log.timestamp <= end]
+            for room_id, room in room_logs.items()
+        }
+        readings = sum(len(room) for room in in_range.values())
+        params = {"start": start.isoformat(), "end": end.isoformat()}
+
+        def get_stats():
+            for room_id in campus.room_ids:
+                response = client.get(f"/stats/{room_id}", params=params)
+                assert response.status_code == 200, response.text
+
+        cases = {
+            "occupancy_percentage": lambda: [
+                main.calculate_occupancy_percentage(room, 5, hours)
+                for room in in_range.values()
+            ],
+            "study_session_duration": lambda: [
+                main.compute_average_study_session_duration(room, 5)
+                for room in in_range.values()
+            ],
+            "stats_endpoint": get_stats,
+        }
+        for name, func in cases.items():
+            results[f"{name}[{length}d]"] = (readings, *measure(func))
+            print(".", end="", flush=True)
+    print()
+    return results
+
+
+def scaling(results: dict) -> dict:
+    """
+    Case name -> (exponent of its time against readings since the shortest range
+    of the same case, readings ratio to it); the exponent is 1.0 when the time per
+    reading stays constant
+    """
+    exponents = {}
+    shortest = {}
+    for name, (readings, seconds, _) in results.items():
+        case = name.split("[")[0]
+        if case in shortest and readings > shortest[case][0]:
+            first_readings, first_seconds = shortest[case]
+            ratio = readings / first_readings
+            exponents[name] = (
+                math.log(seconds / first_seconds) / math.log(ratio),
+                ratio,
+            )
+        shortest.setdefault(case, (readings, seconds))
+    return exponents
+
+
+def load_baseline() -> dict:
+    if not BASELINE.exists():
+        return {"cases": {}}
+    return json.loads(BASELINE.read_text())
+
+
+def save_baseline(results: dict):
+    BASELINE.parent.mkdir(exist_ok=True)
+    baseline = {
+        "saved": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "cases": {
+            name: {"seconds": seconds, "spread": spread}
+            for name, (_, seconds, spread) in results.items()
+        },
+    }
+    BASELINE.write_text(json.dumps(baseline, indent=2) + "\n")
+    print(f"Baseline saved to {BASELINE}")
+
+
+def report(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Print the results next to the baseline, returning the regressed and the
+    superlinear cases
+    """
+    expected = baseline["cases"]
+    exponents = scaling(results)
+    regressions = []
+    print(
+        f"{'case':<32}{'readings':>10}{'ms':>10}{'us/reading':>12}{'scaling':>9}"
+        f"{'expected ms':>13}{'change':>9}{'allowed':>9}"
+    )
+    for name, (readings, seconds, _) in results.items():
+        line = (
+            f"{name:<32}{readings:>10}{seconds * 1000:>10.2f}"
+            f"{seconds * 1e6 / max(readings, 1):>12.3f}"
+        )
+        exponent, ratio = exponents.get(name, (None, 1))
+        line += f"{exponent:>9.2f}" if exponent is not None else f"{'-':>9}"
+        if name in expected:
+            allowed = max(tolerance, NOISE_MARGIN * expected[name]["spread"])
+            change = seconds / expected[name]["seconds"] - 1
+            line += (
+                f"{expected[name]['seconds'] * 1000:>13.2f}{change:>+9.0%}"
+                f"{allowed:>+9.0%}"
+            )
+            if change > allowed:
+                regressions.append(name)
+                line += "  REGRESSION"
+        else:
+            line += f"{'-':>13}{'new':>9}{'-':>9}"
+        if exponent is not None and exponent > MAX_SCALING:
+            if ratio >= MIN_SCALING_RATIO:
+                regressions.append(name)
+                line += "  SUPERLINEAR"
+            else:
+                line += "  (range too short to check scaling)"
+        print(line)
+    return regressions
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=DAYS)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="relative slowdown over the baseline reported as a regression, at "
+        "least (noisier cases allow more)",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    campus = SyntheticCampus(
+        rooms=ROOMS, days=max(args.days), reading_interval=READING_INTERVAL
+    )
+    logs = fill_database(campus)
+    print(f"{ROOMS} rooms, {max(args.days)} days, {len(logs)} occupancy logs")
+    if args.save_baseline:
+        runs = [
+            run_cases(campus, logs, sorted(args.days)) for _ in range(BASELINE_RUNS)
+        ]
+        results = {
+            name: (
+                readings,
+                statistics.median(run[name][1] for run in runs),
+                statistics.median(run[name][2] for run in runs),
+            )
+            for name, (readings, _, _) in runs[0].items()
+        }
+        superlinear = report(results, {"cases": {}}, 0)
+        if superlinear:
+            print(
+                f"{len(superlinear)} cases scale worse than readings^{MAX_SCALING}, "
+                "baseline not saved"
+            )
+            sys.exit(1)
+        save_baseline(results)
+        return
+
+    results = run_cases(campus, logs, sorted(args.days))
+
+    regressions = report(results, load_baseline(), args.tolerance)
+    if regressions:
+        print(
+            f"{len(regressions)} cases slower than their tolerance allows or "
+            f"scaling worse than readings^{MAX_SCALING}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,89 @@
+"""
+Compare list endpoint encodings on large responses.
+
+Fills a throwaway database with slots, then times GET /slots (rows encoded with
+orjson by RowsResponse) against the previous path, which loaded Slot instances
+and let FastAPI validate and serialize each one through pydantic. Checks both
+return the same JSON.
+
+Usage (from the server directory):
+    python benchmarks/bench_list_encoding.py [rows]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["FOMO_DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+import main
+from main import Slot
+
+REPEATS = 5
+
+
+def fill_slots(rows: int) -> tuple[datetime, datetime]:
+    main.create_db_and_tables()
+    start = datetime(2025, 1, 6, 8)
+    rooms = 18
+    with Session(main.engine) as session:
+        session.execute(
+            insert(Slot),
+            [
+                {
+                    "itemId": 18500 + i % rooms,
+                    "start": start + timedelta(minutes=30 * (i // rooms)),
+                    "end": start + timedelta(minutes=30 * (i // rooms + 1)),
+                    "reserved": i % 3 == 0,
+                    "occupied": i % 2 == 0,
+                }
+                for i in range(rows)
+            ],
+        )
+        session.commit()
+    return start, start + timedelta(minutes=30 * (rows // rooms + 1))
+
+
+@main.app.get("/bench/legacy-slots")
+async def get_slots_legacy(session: main.SessionDep, start: datetime, end: datetime):
+    statement = select(Slot).where(Slot.start >= start, Slot.end <= end)
+    return session.exec(statement).all()
+
+
+def best_time(client: TestClient, path: str, params: dict) -> tuple[float, bytes]:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        response = client.get(path, params=params)
+        best = min(best, time.perf_counter() - started)
+    return best, response.content
+
+
+def run_benchmark():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    start, end = fill_slots(rows)
+    params = {"start": start.isoformat(), "end": end.isoformat()}
+
+    client = TestClient(main.app)
+    legacy, legacy_body = best_time(client, "/bench/legacy-slots", params)
+    fast, fast_body = best_time(client, "/slots", params)
+    assert json.loads(legacy_body) == json.loads(fast_body), "JSON shapes differ"
+
+    print(f"GET /slots with {rows} rows, best of {REPEATS}")
+    print(f"{'path':<12}{'ms':>10}{'rows/s':>14}")
+    for name, seconds in (("pydantic", legacy), ("orjson", fast)):
+        print(f"{name:<12}{seconds * 1000:>10.1f}{rows / seconds:>14.0f}")
+    print(f"Speedup: {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
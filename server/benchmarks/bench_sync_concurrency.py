@@ -0,0 +1,102 @@
+"""
+Stress /sync with concurrent units spread over an increasing number of rooms.
+
+Reports throughput and failed requests per room count, with the status codes
+(or 500 for unhandled exceptions such as "database is locked") of the failures.
+SQLite takes one writer at a time, so throughput is bounded by the write rate and
+is not expected to grow with the number of rooms; the room locks only keep
+requests of different rooms from waiting on each other in the application. Runs
+against a throwaway database, never database.db.
+
+Usage (from the server directory):
+    python benchmarks/bench_sync_concurrency.py [requests_per_room] [units_per_room]
+"""
+
+import asyncio
+import os
+from collections import Counter
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["FOMO_DATABASE"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import httpx
+from sqlmodel import Session, select
+
+import device_limits
+import main
+from models import Room, Unit, populate_initial_rooms
+
+ROOM_COUNTS = [1, 2, 4, 8, 16]
+
+# Measure the handler, not the per-device rate limiter
+device_limits.HEARTBEAT_BURST = 10**9
+
+
+def setup_units(units_per_room: int) -> dict[int, list[str]]:
+    """Register units_per_room units in every room, returning their MACs per room"""
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        populate_initial_rooms(session)
+        macs = {}
+        for room in session.exec(select(Room)).all():
+            macs[room.id] = [f"BE:NC:{room.id}:{i:02d}" for i in range(units_per_room)]
+            for mac in macs[room.id]:
+                session.add(Unit(macAddress=mac, roomId=room.id))
+        session.commit()
+    return macs
+
+
+async def stress(macs: list[str], requests_per_unit: int) -> tuple[float, Counter]:
+    # Unhandled exceptions become 500 responses instead of aborting the run
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def unit_loop(mac: str) -> Counter:
+            failures = Counter()
+            for i in range(requests_per_unit):
+                response = await client.post(
+                    f"/sync?occupied={i % 2}", headers={"X-Device-MAC": mac}
+                )
+                if response.status_code != 200:
+                    failures[response.status_code] += 1
+            return failures
+
+        started = time.perf_counter()
+        failures = await asyncio.gather(*(unit_loop(mac) for mac in macs))
+        return time.perf_counter() - started, sum(failures, Counter())
+
+
+def run_benchmark():
+    requests_per_room = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    units_per_room = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    macs = setup_units(units_per_room)
+    room_ids = sorted(macs)
+
+    total_failures = 0
+    print(f"{'rooms':>6}{'requests':>10}{'failed':>8}{'req/s':>10}  failures")
+    for room_count in ROOM_COUNTS:
+        selected = [mac for room_id in room_ids[:room_count] for mac in macs[room_id]]
+        requests_per_unit = requests_per_room // units_per_room
+        elapsed, failures = asyncio.run(stress(selected, requests_per_unit))
+        total = len(selected) * requests_per_unit
+        statuses = ", ".join(
+            f"{count} x {status}" for status, count in sorted(failures.items())
+        )
+        print(
+            f"{room_count:>6}{total:>10}{failures.total():>8}"
+            f"{total / elapsed:>10.0f}  {statuses or '-'}"
+        )
+        total_failures += failures.total()
+    if total_failures:
+        print(f"{total_failures} requests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_benchmark()
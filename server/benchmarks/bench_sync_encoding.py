@@ -0,0 +1,61 @@
+"""
+Compare the encodings available for the /sync room status.
+
+Usage (from the server directory):
+    python benchmarks/bench_sync_encoding.py [iterations]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import wire_format
+from main import RoomStatus
+
+FIELDS = (18508, "Netherlands", 1763650800, True, True, 1763652600, 1763652600)
+
+
+def encode_json() -> bytes:
+    return (
+        RoomStatus(
+            room_id=FIELDS[0],
+            room_name=FIELDS[1],
+            current_time=FIELDS[2],
+            currently_reserved=FIELDS[3],
+            currently_open=FIELDS[4],
+            current_reservation_ends=FIELDS[5],
+            next_reservation_starts=FIELDS[6],
+        )
+        .model_dump_json()
+        .encode()
+    )
+
+
+def encode_msgpack() -> bytes:
+    return wire_format.msgpack_room_status(FIELDS)
+
+
+def encode_packed() -> bytes:
+    return wire_format.pack_room_status(FIELDS)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    encoders = {
+        "json (pydantic)": encode_json,
+        "msgpack": encode_msgpack,
+        "packed struct": encode_packed,
+    }
+
+    assert wire_format.unpack_room_status(encode_packed()) == FIELDS
+
+    print(f"{'encoding':<18}{'bytes':>8}{'us/op':>10}")
+    for name, encode in encoders.items():
+        seconds = min(timeit.repeat(encode, number=iterations, repeat=5))
+        print(f"{name:<18}{len(encode()):>8}{seconds / iterations * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Exercise the LibCal ingestion against a local stub LibCal with many locations.
+
+Starts a stub availability grid server on localhost, points FOMO at it with a
+generated locations file, then refreshes through outages: every location up, a
+flaky location recovered by retries, changed reservations, some locations down
+until their circuit breakers open, and recovery once the cooldown is over.
+Asserts the outcome of every step (retries, breaker states, no requests to open
+circuits, down locations keeping their last good grid, refreshes updating only
+Slot.reserved, configured rooms only re-added on an explicit sync) and reports
+refresh times next to the sequential lower bound. Runs against a throwaway
+database, never database.db.
+
+Usage (from the server directory):
+    python benchmarks/stub_libcal.py [--locations 40] [--down 10] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ROOMS_PER_LOCATION = 18
+FIRST_LID = 1000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_locations(path: str, count: int):
+    locations = [
+        {
+            "name": f"Library {i}",
+            "building": f"Library {i}",
+            "lid": FIRST_LID + i,
+            "gid": 5000 + i,
+            "slug": f"library-{i}",
+            "rooms": [
+                {
+                    "id": 100000 + i * 100 + room,
+                    "name": f"Room {room}",
+                    "code": f"L{i} {room}",
+                }
+                for room in range(ROOMS_PER_LOCATION)
+            ],
+        }
+        for i in range(count)
+    ]
+    with open(path, "w") as f:
+        json.dump(locations, f)
+
+
+class StubState:
+    def __init__(self):
+        self.down: set[int] = set()
+        # lid -> requests left to fail before answering
+        self.flaky: dict[int, int] = {}
+        # Reserve the other slots than usual
+        self.flipped = False
+        self.requests: Counter[int] = Counter()
+
+
+def is_reserved(room: int, slot: int, flipped: bool) -> bool:
+    return ((room + slot) % 3 == 0) != flipped
+
+
+def build_stub(latency: float, state: StubState):
+    """Stub of LibCal's grid endpoint, failing for down and flaky lids"""
+    from fastapi import FastAPI, Request, Response
+
+    stub = FastAPI()
+
+    @stub.post("/spaces/availability/grid")
+    async def grid(request: Request):
+        form = parse_qs((await request.body()).decode())
+        lid = int(form["lid"][0])
+        state.requests[lid] += 1
+        await asyncio.sleep(latency)
+        if lid in state.down:
+            return Response(status_code=503)
+        if state.flaky.get(lid):
+            state.flaky[lid] -= 1
+            return Response(status_code=502)
+        day = datetime.fromisoformat(form["start"][0])
+        slots = []
+        for room in range(ROOMS_PER_LOCATION):
+            item_id = 100000 + (lid - FIRST_LID) * 100 + room
+            for slot in range(48):
+                start = day + timedelta(minutes=30 * slot)
+                entry = {
+                    "itemId": item_id,
+                    "start": start.isoformat(sep=" "),
+                    "end": (start + timedelta(minutes=30)).isoformat(sep=" "),
+                }
+                if is_reserved(room, slot, state.flipped):
+                    entry["className"] = "s-lc-eq-checkout"
+                slots.append(entry)
+        return {"slots": slots}
+
+    return stub
+
+
+def location_slots(session, Slot, index: int) -> dict[tuple, tuple[bool, bool]]:
+    """(room, start) -> (reserved, occupied) of a location's slots"""
+    from sqlmodel import select
+
+    first_room = 100000 + index * 100
+    statement = select(Slot.itemId, Slot.start, Slot.reserved, Slot.occupied).where(
+        Slot.itemId >= first_room, Slot.itemId < first_room + ROOMS_PER_LOCATION
+    )
+    return {
+        (room_id, start): (reserved, occupied)
+        for room_id, start, reserved, occupied in session.exec(statement).all()
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, default=40)
+    parser.add_argument("--down", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    os.environ["FOMO_DATABASE"] = os.path.join(workdir, "stub.db")
+    os.environ["FOMO_LIBCAL_LOCATIONS"] = os.path.join(workdir, "locations.json")
+    os.environ["FOMO_LIBCAL_URL"] = f"http://127.0.0.1:{port}"
+    write_locations(os.environ["FOMO_LIBCAL_LOCATIONS"], args.locations)
+
+    import uvicorn
+    from sqlmodel import Session, update
+
+    import libcal_routes
+    import main
+    from models import Room, populate_initial_rooms
+
+    libcal_routes.RETRY_BACKOFF_SECONDS = 0.05
+
+    stub = StubState()
+    server = uvicorn.Server(
+        uvicorn.Config(build_stub(args.latency, stub), port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        populate_initial_rooms(session)
+
+    def refresh(label: str):
+        async def refresh_and_close():
+            try:
+                await libcal_routes.refresh_locations(session, date.today())
+            finally:
+                await libcal_routes.close_client()
+
+        started = time.perf_counter()
+        asyncio.run(refresh_and_close())
+        elapsed = time.perf_counter() - started
+        states = breaker_states()
+        print(
+            f"{label:<28}{elapsed:>8.2f}s"
+            f"{states.count('closed'):>8}{states.count('open'):>6}"
+            f"{states.count('half-open'):>11}"
+        )
+
+    def breaker_states() -> list[str]:
+        now = datetime.now()
+        return [
+            libcal_routes.breakers[location.name].state(now)
+            for location in libcal_routes.locations
+        ]
+
+    sequential = args.locations * args.latency
+    print(
+        f"{args.locations} locations x {ROOMS_PER_LOCATION} rooms, "
+        f"{args.latency}s per grid ({sequential:.1f}s sequentially)"
+    )
+    print(f"{'refresh':<28}{'time':>9}{'closed':>8}{'open':>6}{'half-open':>11}")
+
+    with Session(main.engine) as session:
+        refresh("all up")
+        assert breaker_states() == ["closed"] * args.locations
+        for index in range(args.locations):
+            slots = location_slots(session, main.Slot, index)
+            assert len(slots) == ROOMS_PER_LOCATION * 48, f"location {index}"
+
+        # A location failing fewer times than FETCH_ATTEMPTS is saved by retries
+        flaky_lid = FIRST_LID + args.locations - 1
+        stub.flaky[flaky_lid] = libcal_routes.FETCH_ATTEMPTS - 1
+        stub.requests.clear()
+        refresh("flaky location retried")
+        assert stub.requests[flaky_lid] == libcal_routes.FETCH_ATTEMPTS
+        flaky_breaker = libcal_routes.breakers[libcal_routes.locations[-1].name]
+        assert flaky_breaker.state(datetime.now()) == "closed"
+        assert flaky_breaker.consecutive_failures == 0
+
+        # Refreshes update the reservation state only, never sensor occupancy
+        first_room = 100000
+        session.exec(
+            update(main.Slot)
+            .where(main.Slot.itemId == first_room)
+            .values(occupied=True)
+        )
+        session.commit()
+        before = location_slots(session, main.Slot, 0)
+        stub.flipped = True
+        refresh("reservations changed")
+        after = location_slots(session, main.Slot, 0)
+        assert after.keys() == before.keys()
+        for (room_id, start), (reserved, occupied) in after.items():
+            assert reserved != before[(room_id, start)][0]
+            assert occupied == (room_id == first_room)
+
+        down = [FIRST_LID + i for i in range(args.down)]
+        before = {i: location_slots(session, main.Slot, i) for i in range(args.down)}
+        stub.down.update(down)
+        stub.flipped = False
+        for attempt in range(libcal_routes.FAILURE_THRESHOLD):
+            refresh(f"{args.down} down ({attempt + 1})")
+        states = breaker_states()
+        assert states[: args.down] == ["open"] * args.down
+        assert states[args.down :] == ["closed"] * (args.locations - args.down)
+
+        stub.requests.clear()
+        refresh(f"{args.down} down (circuit open)")
+        assert not any(stub.requests[lid] for lid in down), "open circuit fetched"
+        after = {i: location_slots(session, main.Slot, i) for i in range(args.down)}
+        assert before == after, "down locations lost their last good grid"
+        print("Down locations kept their last good grid")
+
+        stub.down.clear()
+        for breaker in libcal_routes.breakers.values():
+            if breaker.open_until is not None:
+                breaker.open_until = datetime.now()
+        refresh("recovered (half-open)")
+        assert breaker_states() == ["closed"] * args.locations
+
+        # Deleted rooms stay deleted, unless the configured rooms are synced
+        session.delete(session.get(Room, first_room))
+        session.commit()
+        assert populate_initial_rooms(session) == 0
+        assert session.get(Room, first_room) is None
+        assert populate_initial_rooms(session, sync=True) == 1
+        assert session.get(Room, first_room) is not None
+        print("All checks passed")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    run()
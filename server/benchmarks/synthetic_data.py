@@ -0,0 +1,154 @@
+"""
+Deterministic synthetic slot grids and occupancy logs for benchmarks.
+
+Rooms follow the default building's opening hours (8:00-23:00) with 30 minute
+slots. Reservations come in blocks of one to four slots, more likely in the
+afternoon and on weekdays, and vary with each room's popularity. Units report
+once per reading interval while the building is open: honored reservations and
+walk-ins are mostly occupied, ghost reservations are not, a few readings fall
+after closing (intruders), and some days have a sensor outage of one to three
+hours without readings. The same seed always gives the same data.
+"""
+
+import math
+import random
+from datetime import date, datetime, timedelta
+
+OPEN_HOUR = 8
+CLOSE_HOUR = 23
+SLOT = timedelta(minutes=30)
+SLOTS_PER_DAY = (CLOSE_HOUR - OPEN_HOUR) * 2
+FIRST_ROOM_ID = 90_000
+
+# Chance a reservation is honored, i.e. not a ghost reservation
+HONORED = 0.8
+# Chance a reading says occupied while a session is going on / the room is empty
+OCCUPIED_IN_SESSION = 0.9
+OCCUPIED_WHEN_EMPTY = 0.03
+# Chance a room has a sensor outage on a given day
+OUTAGE_PER_DAY = 0.05
+# Chance a room has someone in it after closing on a given day
+INTRUDER_PER_DAY = 0.1
+
+
+def demand(slot: int, weekday: int) -> float:
+    """Relative demand of a slot of the day: peaks mid-afternoon, lower on weekends"""
+    hour = OPEN_HOUR + slot / 2
+    peak = math.exp(-(((hour - 15) / 4) ** 2))
+    return peak * (0.5 if weekday >= 5 else 1.0)
+
+
+class SyntheticCampus:
+    def __init__(
+        self,
+        rooms: int = 4,
+        days: int = 28,
+        start: date = date(2025, 1, 6),
+        reading_interval: timedelta = timedelta(minutes=1),
+        seed: int = 0,
+    ):
+        self.room_ids = [FIRST_ROOM_ID + i for i in range(rooms)]
+        self.days = [start + timedelta(days=i) for i in range(days)]
+        self.reading_interval = reading_interval
+        self.seed = seed
+
+    @property
+    def start(self) -> datetime:
+        return datetime.combine(self.days[0], datetime.min.time())
+
+    @property
+    def end(self) -> datetime:
+        return datetime.combine(self.days[-1] + timedelta(days=1), datetime.min.time())
+
+    def rooms(self) -> list[dict]:
+        return [
+            {
+                "id": room_id,
+                "name": f"Synthetic {room_id}",
+                "code": f"S{room_id}",
+                "building": "Webster",
+            }
+            for room_id in self.room_ids
+        ]
+
+    def generate(self) -> tuple[list[dict], list[dict]]:
+        """Slot rows and occupancy log rows of every room, ready for executemany"""
+        slots, logs = [], []
+        for room_id in self.room_ids:
+            # One generator per room, so a room's data does not depend on the others
+            rng = random.Random(f"{self.seed}:{room_id}")
+            popularity = rng.uniform(0.4, 1.0)
+            for day in self.days:
+                day_slots, day_logs = self.room_day(rng, room_id, popularity, day)
+                slots += day_slots
+                logs += day_logs
+        return slots, logs
+
+    def room_day(
+        self, rng: random.Random, room_id: int, popularity: float, day: date
+    ) -> tuple[list[dict], list[dict]]:
+        opening = datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=OPEN_HOUR
+        )
+
+        reserved = [False] * SLOTS_PER_DAY
+        slot = 0
+        while slot < SLOTS_PER_DAY:
+            if rng.random() < 0.35 * popularity * demand(slot, day.weekday()):
+                length = rng.randint(1, 4)
+                reserved[slot : slot + length] = [True] * min(
+                    length, SLOTS_PER_DAY - slot
+                )
+                slot += length
+            else:
+                slot += 1
+
+        # Whether someone is in the room during each slot
+        in_use = [
+            (
+                (rng.random() < HONORED)
+                if is_reserved
+                else rng.random() < 0.15 * popularity * demand(slot, day.weekday())
+            )
+            for slot, is_reserved in enumerate(reserved)
+        ]
+
+        outage = None
+        if rng.random() < OUTAGE_PER_DAY:
+            outage_start = opening + timedelta(minutes=rng.randrange(0, 12 * 60, 30))
+            outage = (outage_start, outage_start + timedelta(hours=rng.randint(1, 3)))
+
+        logs = []
+        closing = opening + SLOT * SLOTS_PER_DAY
+        timestamp = opening
+        while timestamp < closing:
+            if outage is None or not outage[0] <= timestamp < outage[1]:
+                slot = int((timestamp - opening) / SLOT)
+                p = OCCUPIED_IN_SESSION if in_use[slot] else OCCUPIED_WHEN_EMPTY
+                logs.append(
+                    {
+                        "itemId": room_id,
+                        "timestamp": timestamp,
+                        "occupied": rng.random() < p,
+                    }
+                )
+            timestamp += self.reading_interval
+        if rng.random() < INTRUDER_PER_DAY:
+            timestamp = closing + timedelta(minutes=rng.randint(1, 50))
+            for _ in range(rng.randint(1, 10)):
+                logs.append(
+                    {"itemId": room_id, "timestamp": timestamp, "occupied": True}
+                )
+                timestamp += self.reading_interval
+
+        slots = [
+            {
+                "itemId": room_id,
+                "start": opening + SLOT * slot,
+                "end": opening + SLOT * (slot + 1),
+                "reserved": is_reserved,
+                "occupied": in_use[slot],
+            }
+            for slot, is_reserved in enumerate(reserved)
+        ]
+        return slots, logs
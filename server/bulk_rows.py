@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+from typing import Any, Callable, Hashable, TypeVar
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+
+# Rows per bulk request, well under SQLite's limit on IN query parameters
+MAX_BULK_ROWS = 5000
+
+RowModel = TypeVar("RowModel", bound=BaseModel)
+
+
+class BulkRowError(BaseModel):
+    row: int  # 1-based, not counting a CSV header
+    error: str
+
+
+class BulkResult(BaseModel):
+    created: int
+    updated: int
+
+
+async def read_rows(request: Request) -> list[dict[str, Any]]:
+    """Rows of a bulk request body: a CSV with a header line, or a JSON array of objects"""
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        try:
+            text = body.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise HTTPException(
+                status_code=400, detail="Expected a JSON array of objects"
+            )
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per request"
+        )
+    return rows
+
+
+def validate_rows(
+    rows: list[dict[str, Any]],
+    model: type[RowModel],
+    key: Callable[[RowModel], Hashable],
+    errors: list[BulkRowError],
+) -> list[tuple[int, RowModel]]:
+    """
+    Validate every row against the model, returning the valid ones with their row
+    number. Invalid rows and repeated keys are added to errors.
+    """
+    valid = []
+    first_row: dict[Hashable, int] = {}
+    for number, row in enumerate(rows, start=1):
+        try:
+            item = model.model_validate(row)
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                for err in e.errors()
+            )
+            errors.append(BulkRowError(row=number, error=error))
+            continue
+        if key(item) in first_row:
+            errors.append(
+                BulkRowError(
+                    row=number, error=f"Duplicate of row {first_row[key(item)]}"
+                )
+            )
+            continue
+        first_row[key(item)] = number
+        valid.append((number, item))
+    return valid
+
+
+def raise_row_errors(errors: list[BulkRowError]):
+    """Reject the whole request, listing the errors by row"""
+    if errors:
+        errors.sort(key=lambda error: error.row)
+        raise HTTPException(
+            status_code=422,
+            detail={"errors": [error.model_dump() for error in errors]},
+        )
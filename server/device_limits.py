@@ -0,0 +1,189 @@
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from enum import Enum
+from threading import Lock
+
+from pydantic import BaseModel
+
+# Units sync about once a minute: allow three times that, plus a burst of retries
+HEARTBEAT_RATE = 1 / 20  # tokens per second
+HEARTBEAT_BURST = 10
+# A device rejected this many times within the window is quarantined
+QUARANTINE_AFTER = 30
+QUARANTINE_WINDOW = timedelta(minutes=5)
+QUARANTINE_DURATION = timedelta(minutes=30)
+# Readings of rate-limited heartbeats kept per device until its next admitted one
+MAX_PENDING_READINGS = 60
+# Auto-registrations of unknown MACs, across all devices
+REGISTRATION_RATE = 1 / 6
+REGISTRATION_BURST = 20
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def wait_time(self) -> float:
+        """Seconds until the next token"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Verdict(str, Enum):
+    ALLOWED = "allowed"
+    LIMITED = "limited"  # over the rate: the reading is deferred
+    QUARANTINED = "quarantined"  # dropped until the quarantine ends
+
+
+class DeviceState:
+    def __init__(self):
+        self.bucket = TokenBucket(HEARTBEAT_RATE, HEARTBEAT_BURST)
+        self.rejections = 0
+        self.first_rejection: datetime | None = None
+        self.quarantined_at: datetime | None = None
+        self.quarantined_until: datetime | None = None
+        self.dropped = 0
+        self.pending: deque[tuple[datetime, bool]] = deque(maxlen=MAX_PENDING_READINGS)
+
+
+class QuarantinedDevice(BaseModel):
+    mac_address: str
+    quarantined_at: datetime
+    quarantined_until: datetime
+    dropped_heartbeats: int
+
+
+class DeviceRateLimiter:
+    """
+    In-memory token buckets per device MAC, checked before any database work.
+
+    Excess heartbeats are rejected and their readings coalesced into the device's
+    next admitted heartbeat. A device that keeps exceeding its rate is quarantined:
+    its heartbeats are dropped outright until the quarantine ends. Only the
+    max_devices most recently seen devices are tracked.
+    """
+
+    def __init__(self, max_devices: int = 4096):
+        self.max_devices = max_devices
+        self._devices: OrderedDict[str, DeviceState] = OrderedDict()
+        self._lock = Lock()
+
+    def _state(self, mac_address: str) -> DeviceState:
+        state = self._devices.get(mac_address)
+        if state is None:
+            state = DeviceState()
+            self._devices[mac_address] = state
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(mac_address)
+        return state
+
+    def check(self, mac_address: str) -> tuple[Verdict, float]:
+        """Admit or reject a heartbeat, returning the verdict and a retry delay"""
+        now = datetime.now()
+        with self._lock:
+            state = self._state(mac_address)
+            if state.quarantined_until is not None:
+                if now < state.quarantined_until:
+                    state.dropped += 1
+                    return (
+                        Verdict.QUARANTINED,
+                        (state.quarantined_until - now).total_seconds(),
+                    )
+                state.quarantined_at = state.quarantined_until = None
+                state.rejections = 0
+
+            if state.bucket.consume():
+                return Verdict.ALLOWED, 0.0
+
+            if (
+                state.first_rejection is None
+                or now - state.first_rejection > QUARANTINE_WINDOW
+            ):
+                state.rejections = 0
+                state.first_rejection = now
+            state.rejections += 1
+            state.dropped += 1
+            if state.rejections >= QUARANTINE_AFTER:
+                state.quarantined_at = now
+                state.quarantined_until = now + QUARANTINE_DURATION
+                state.pending.clear()
+                print(
+                    f"Quarantined device {mac_address} until {state.quarantined_until}"
+                )
+                return Verdict.QUARANTINED, QUARANTINE_DURATION.total_seconds()
+            return Verdict.LIMITED, state.bucket.wait_time()
+
+    def defer(self, mac_address: str, reading: tuple[datetime, bool]):
+        """Keep the reading of a rejected heartbeat for the next admitted one"""
+        with self._lock:
+            self._state(mac_address).pending.append(reading)
+
+    def take_pending(self, mac_address: str) -> list[tuple[datetime, bool]]:
+        with self._lock:
+            state = self._devices.get(mac_address)
+            if state is None or not state.pending:
+                return []
+            pending = list(state.pending)
+            state.pending.clear()
+            return pending
+
+    def restore_pending(self, mac_address: str, readings: list[tuple[datetime, bool]]):
+        """Put back pending readings of a heartbeat that failed, before newer ones"""
+        if not readings:
+            return
+        with self._lock:
+            state = self._state(mac_address)
+            # Quarantine drops a device's pending readings
+            if state.quarantined_until is not None:
+                return
+            state.pending = deque(
+                [*readings, *state.pending], maxlen=MAX_PENDING_READINGS
+            )
+
+    def quarantined(self) -> list[QuarantinedDevice]:
+        now = datetime.now()
+        with self._lock:
+            return [
+                QuarantinedDevice(
+                    mac_address=mac_address,
+                    quarantined_at=state.quarantined_at,
+                    quarantined_until=state.quarantined_until,
+                    dropped_heartbeats=state.dropped,
+                )
+                for mac_address, state in self._devices.items()
+                if state.quarantined_until is not None and now < state.quarantined_until
+            ]
+
+    def release(self, mac_address: str) -> bool:
+        """Lift a device's quarantine and reset its limits"""
+        with self._lock:
+            state = self._devices.pop(mac_address, None)
+            return state is not None and state.quarantined_until is not None
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+
+heartbeats = DeviceRateLimiter()
+registrations = TokenBucket(REGISTRATION_RATE, REGISTRATION_BURST)
@@ -0,0 +1,30 @@
+from typing import Any, Iterable
+
+from fastapi.responses import ORJSONResponse
+from sqlmodel import SQLModel, select
+
+
+def row_columns(model: type[SQLModel]) -> list[str]:
+    """Names of a table model's columns, in field order"""
+    return [column.name for column in model.__table__.columns]
+
+
+def select_rows(model: type[SQLModel]):
+    """Select a table model's columns as plain tuples instead of model instances"""
+    return select(*model.__table__.columns)
+
+
+class RowsResponse(ORJSONResponse):
+    """
+    JSON array of objects encoded with orjson straight from row tuples.
+
+    Same shape as returning the model instances, without building them or running
+    FastAPI's pydantic validation and serialization per row. Routes keep their
+    response_model for the OpenAPI schema; it is not applied to this response.
+    """
+
+    def __init__(
+        self, model: type[SQLModel], rows: Iterable[tuple[Any, ...]], **kwargs
+    ):
+        columns = row_columns(model)
+        super().__init__([dict(zip(columns, row)) for row in rows], **kwargs)
@@ -0,0 +1,222 @@
+import heapq
+from datetime import datetime, timedelta
+from enum import Enum
+from threading import Lock
+
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from models import Unit
+
+# Units sync about once a minute
+EXPECTED_SYNC_INTERVAL = timedelta(minutes=1)
+# A unit missing this long is stale, then dead
+STALE_AFTER = 3 * EXPECTED_SYNC_INTERVAL
+DEAD_AFTER = timedelta(minutes=15)
+# A room has no live sensor after this many of its reading intervals without one
+MISSED_READINGS_FOR_GAP = 3
+
+
+class UnitHealth(str, Enum):
+    HEALTHY = "healthy"
+    STALE = "stale"
+    DEAD = "dead"
+
+
+class UnitState:
+    def __init__(self, unit_id: int, room_id: int, last_seen: datetime):
+        self.unit_id = unit_id
+        self.room_id = room_id
+        self.last_seen = last_seen
+        self.health = UnitHealth.HEALTHY
+        self.generation = 0
+
+
+class UnitStatus(BaseModel):
+    mac_address: str
+    unit_id: int
+    room_id: int
+    last_seen: datetime
+    seconds_since_last_seen: int
+    health: UnitHealth
+
+
+class FleetHealthTracker:
+    """
+    Health of every unit from its heartbeats, without scanning the Unit table.
+
+    Each heartbeat pushes the unit's next deadline (last seen + STALE_AFTER) on a
+    heap; advancing the clock pops the expired deadlines only, marking the unit
+    stale and pushing its DEAD_AFTER deadline. Deadlines made obsolete by a newer
+    heartbeat are recognized by their generation and skipped.
+
+    Each worker only sees the heartbeats it serves, so sync() catches up with the
+    units' lastSync in the database (written by every heartbeat) at startup and
+    every minute (see check_fleet_health in main). That lags less than
+    STALE_AFTER, so a unit heard by any worker never turns stale on the others.
+    """
+
+    def __init__(self):
+        self.units: dict[str, UnitState] = {}
+        self._deadlines: list[tuple[datetime, str, int]] = []
+        self._lock = Lock()
+
+    def _push(self, mac_address: str, state: UnitState):
+        if state.health == UnitHealth.HEALTHY:
+            deadline = state.last_seen + STALE_AFTER
+        elif state.health == UnitHealth.STALE:
+            deadline = state.last_seen + DEAD_AFTER
+        else:
+            return
+        heapq.heappush(self._deadlines, (deadline, mac_address, state.generation))
+
+    def record(self, mac_address: str, unit_id: int, room_id: int, seen: datetime):
+        with self._lock:
+            state = self.units.get(mac_address)
+            if state is None:
+                state = UnitState(unit_id, room_id, seen)
+                self.units[mac_address] = state
+            elif seen <= state.last_seen:
+                return
+            else:
+                if state.health != UnitHealth.HEALTHY:
+                    print(
+                        f"Unit {mac_address} is back after being {state.health.value}"
+                    )
+                state.room_id = room_id
+                state.last_seen = seen
+                state.health = UnitHealth.HEALTHY
+                state.generation += 1
+            self._push(mac_address, state)
+
+    def reassign(self, rooms: dict[str, int]):
+        """Move tracked units to new rooms, by MAC address"""
+        with self._lock:
+            for mac_address, room_id in rooms.items():
+                state = self.units.get(mac_address)
+                if state is not None:
+                    state.room_id = room_id
+
+    def advance(self, now: datetime) -> list[tuple[str, UnitHealth]]:
+        """Apply the deadlines up to `now`, returning the health transitions"""
+        transitions = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, mac_address, generation = heapq.heappop(self._deadlines)
+                state = self.units.get(mac_address)
+                if state is None or state.generation != generation:
+                    continue
+                state.health = (
+                    UnitHealth.STALE
+                    if state.health == UnitHealth.HEALTHY
+                    else UnitHealth.DEAD
+                )
+                transitions.append((mac_address, state.health))
+                self._push(mac_address, state)
+        return transitions
+
+    def sync(self, session: Session, now: datetime) -> list[tuple[str, UnitHealth]]:
+        """
+        Catch up with the units' last sync in the database, e.g. after a restart or
+        heartbeats served by other workers, dropping deleted units. Returns the
+        health transitions up to `now`.
+        """
+        units = session.exec(
+            select(Unit.macAddress, Unit.id, Unit.roomId, Unit.lastSync)
+        ).all()
+        for mac_address, unit_id, room_id, last_sync in units:
+            self.record(mac_address, unit_id, room_id, last_sync)
+        # Units reassigned by another worker keep their last sync
+        self.reassign({unit[0]: unit[2] for unit in units})
+        known = {unit[0] for unit in units}
+        with self._lock:
+            for mac_address in self.units.keys() - known:
+                del self.units[mac_address]
+        return self.advance(now)
+
+    def statuses(self, now: datetime) -> list[UnitStatus]:
+        self.advance(now)
+        with self._lock:
+            return [
+                UnitStatus(
+                    mac_address=mac_address,
+                    unit_id=state.unit_id,
+                    room_id=state.room_id,
+                    last_seen=state.last_seen,
+                    seconds_since_last_seen=int(
+                        (now - state.last_seen).total_seconds()
+                    ),
+                    health=state.health,
+                )
+                for mac_address, state in self.units.items()
+            ]
+
+
+tracker = FleetHealthTracker()
+
+
+def reading_interval(timestamps: list[datetime]) -> timedelta:
+    """
+    Typical interval between a room's sorted reading timestamps (the median one),
+    e.g. the sync interval for live data or the cadence of imported history
+    """
+    intervals = sorted(
+        later - earlier
+        for earlier, later in zip(timestamps, timestamps[1:])
+        if later > earlier
+    )
+    if not intervals:
+        return EXPECTED_SYNC_INTERVAL
+    return max(EXPECTED_SYNC_INTERVAL, intervals[len(intervals) // 2])
+
+
+def sensor_gaps(
+    timestamps: list[datetime],
+    start: datetime,
+    end: datetime,
+    max_silence: timedelta | None = None,
+) -> list[tuple[datetime, datetime]]:
+    """
+    Periods of [start, end) without a live sensor in a room, from its sorted
+    reading timestamps: every stretch longer than max_silence without a reading,
+    by default MISSED_READINGS_FOR_GAP of the room's reading intervals.
+
+    Units report unoccupied readings too, so these periods are unknown rather
+    than unoccupied and analytics should leave them out.
+    """
+    if max_silence is None:
+        max_silence = MISSED_READINGS_FOR_GAP * reading_interval(timestamps)
+    end = min(end, datetime.now())
+    gaps = []
+    previous = start
+    for timestamp in timestamps + [end]:
+        if timestamp - previous > max_silence:
+            gaps.append((previous, min(timestamp, end)))
+        previous = max(previous, timestamp)
+    return gaps
+
+
+def covered_by_gaps(
+    gaps: list[tuple[datetime, datetime]], start: datetime, end: datetime
+) -> bool:
+    """Whether [start, end) lies entirely in one sensor gap"""
+    return any(gap_start <= start and end <= gap_end for gap_start, gap_end in gaps)
+
+
+def outside_gaps(
+    intervals: list[tuple[datetime, datetime]], gaps: list[tuple[datetime, datetime]]
+) -> list[tuple[datetime, datetime]]:
+    """The parts of sorted, disjoint intervals that are not in any sensor gap"""
+    remaining = []
+    for start, end in intervals:
+        for gap_start, gap_end in gaps:
+            if gap_end <= start or end <= gap_start:
+                continue
+            if start < gap_start:
+                remaining.append((start, gap_start))
+            start = max(start, gap_end)
+            if start >= end:
+                break
+        if start < end:
+            remaining.append((start, end))
+    return remaining
@@ -0,0 +1,230 @@
+from datetime import date, datetime, timedelta
+from threading import Lock
+from typing import Annotated
+
+import numpy as np
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from models import Room
+
+router = APIRouter(prefix="/forecast", tags=["forecast"])
+
+SLOTS_PER_DAY = 48
+# Weeks of slot history used by the nightly precompute
+HISTORY_WEEKS = 12
+# Axes (room, weekday, slot) pooled at each level of the shrinkage, coarsest
+# first after the overall rate: per slot of the day, per room x slot, per cell
+POOLED_AXES = [(0, 1), (1,), ()]
+# Prior weight of cells that vary no more than sampling noise around their level
+MAX_PRIOR_WEIGHT = 1e6
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class OccupancyForecaster:
+    """
+    Historical probability that a slot ends up occupied.
+
+    Probabilities are precomputed per room x weekday x half-hour slot x reserved,
+    so forecasting every room is a handful of array lookups. Each cell is shrunk
+    towards its room x slot rate (all weekdays), itself shrunk towards the slot's
+    rate across rooms, then the overall rate of reserved/unreserved slots. The
+    weight of each level comes from the data (empirical Bayes): the less its
+    cells vary beyond sampling noise, the more they take their parent's rate.
+    """
+
+    def __init__(self):
+        self.room_index: dict[int, int] = {}
+        self.probabilities = np.zeros((0, 7, SLOTS_PER_DAY, 2))
+        self.prior = np.zeros(2)
+        self.trained_at: datetime | None = None
+        self._lock = Lock()
+
+    def fit(self, rows: list[tuple[int, datetime, bool, bool]]):
+        """Precompute probabilities from (room_id, start, reserved, occupied) slots"""
+        room_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        starts = np.array([row[1] for row in rows], dtype="datetime64[m]")
+        reserved = np.array([row[2] for row in rows], dtype=np.int64)
+        occupied = np.array([row[3] for row in rows], dtype=np.float64)
+
+        rooms, room_rows = np.unique(room_ids, return_inverse=True)
+        minutes = starts.astype(np.int64)
+        # 1970-01-01 was a Thursday (weekday 3)
+        weekdays = (minutes // (24 * 60) + 3) % 7
+        slots = (minutes % (24 * 60)) // 30
+
+        shape = (len(rooms), 7, SLOTS_PER_DAY, 2)
+        totals = np.zeros(shape)
+        occupied_counts = np.zeros(shape)
+        index = (room_rows, weekdays, slots, reserved)
+        np.add.at(totals, index, 1)
+        np.add.at(occupied_counts, index, occupied)
+
+        prior = occupied_counts.sum(axis=(0, 1, 2)) / np.maximum(
+            totals.sum(axis=(0, 1, 2)), 1
+        )
+        probabilities = prior
+        for axes in POOLED_AXES:
+            level_totals = totals.sum(axis=axes, keepdims=True)
+            level_counts = occupied_counts.sum(axis=axes, keepdims=True)
+            weight = prior_weight(level_counts, level_totals, probabilities)
+            probabilities = (level_counts + weight * probabilities) / (
+                level_totals + weight
+            )
+
+        with self._lock:
+            self.room_index = {int(room): i for i, room in enumerate(rooms)}
+            self.probabilities = probabilities
+            self.prior = prior
+            self.trained_at = datetime.now()
+
+    def predict(
+        self, room_ids: list[int], day: date, reserved: np.ndarray
+    ) -> np.ndarray:
+        """
+        Occupancy probability of every slot of `day` for the given rooms.
+
+        `reserved` is a (rooms x SLOTS_PER_DAY) boolean grid; rooms without history
+        fall back to the overall rate.
+        """
+        with self._lock:
+            room_index = self.room_index
+            probabilities = self.probabilities
+            prior = self.prior
+
+        reserved = reserved.astype(np.int64)
+        result = prior[reserved]
+        rows = np.array([room_index.get(room_id, -1) for room_id in room_ids])
+        known = rows >= 0
+        if known.any():
+            result[known] = probabilities[
+                rows[known][:, None],
+                day.weekday(),
+                np.arange(SLOTS_PER_DAY)[None, :],
+                reserved[known],
+            ]
+        return result
+
+
+def prior_weight(
+    counts: np.ndarray, totals: np.ndarray, parent: np.ndarray
+) -> np.ndarray:
+    """
+    Prior weight (in slots) of the parent rates for each reserved flag's cells, by
+    the method of moments: the binomial noise of one slot over the variance of the
+    cells' true rates around their parent, i.e. how far their observed rates
+    spread beyond what sampling noise explains.
+    """
+    axes = tuple(range(counts.ndim - 1))
+    parent = np.broadcast_to(parent, counts.shape)
+    rates = counts / np.maximum(totals, 1)
+    noise = parent * (1 - parent)
+    slots = np.maximum(totals.sum(axis=axes), 1)
+    variance = (
+        (totals * (rates - parent) ** 2).sum(axis=axes)
+        - np.where(totals > 0, noise, 0).sum(axis=axes)
+    ) / slots
+    mean_noise = (totals * noise).sum(axis=axes) / slots
+    weight = mean_noise / np.maximum(variance, 1e-12)
+    return np.where(
+        variance > 0, np.minimum(weight, MAX_PRIOR_WEIGHT), MAX_PRIOR_WEIGHT
+    )
+
+
+forecaster = OccupancyForecaster()
+
+
+def precompute_forecast(session: Session):
+    """Refit the forecaster on the last HISTORY_WEEKS of slots"""
+    from main import Slot
+
+    since = datetime.combine(date.today(), datetime.min.time()) - timedelta(
+        weeks=HISTORY_WEEKS
+    )
+    statement = select(Slot.itemId, Slot.start, Slot.reserved, Slot.occupied).where(
+        Slot.start >= since
+    )
+    rows = session.exec(statement).all()
+    forecaster.fit(rows)
+    print(f"Forecast probabilities precomputed from {len(rows)} slots")
+
+
+def reserved_grid(session: Session, room_ids: list[int], day: date) -> np.ndarray:
+    """Reservation state of every slot of `day` from the LibCal grid"""
+    from main import Slot
+
+    day_start = datetime.combine(day, datetime.min.time())
+    statement = select(Slot.itemId, Slot.start).where(
+        Slot.reserved == True,
+        Slot.start >= day_start,
+        Slot.start < day_start + timedelta(days=1),
+    )
+    positions = {room_id: i for i, room_id in enumerate(room_ids)}
+    grid = np.zeros((len(room_ids), SLOTS_PER_DAY), dtype=bool)
+    for room_id, start in session.exec(statement).all():
+        if room_id in positions:
+            grid[positions[room_id], (start.hour * 60 + start.minute) // 30] = True
+    return grid
+
+
+class SlotForecast(BaseModel):
+    start: datetime
+    reserved: bool
+    occupancy_probability: float
+    free_probability: float
+
+
+class RoomForecast(BaseModel):
+    room_id: int
+    room_name: str
+    slots: list[SlotForecast]
+
+
+@router.get("/", response_model=list[RoomForecast])
+async def get_forecast(
+    session: Session = SessionDep,
+    at: Annotated[datetime | None, Query()] = None,
+):
+    """
+    Forecast the remaining slots of the day for every room.
+
+    A reserved slot is never free; otherwise the free probability is the chance
+    the room stays unoccupied, from the precomputed history.
+    """
+    if at is None:
+        at = datetime.now()
+    rooms = session.exec(select(Room)).all()
+    room_ids = [room.id for room in rooms]
+
+    reserved = reserved_grid(session, room_ids, at.date())
+    probabilities = forecaster.predict(room_ids, at.date(), reserved)
+    free = np.where(reserved, 0.0, 1.0 - probabilities)
+
+    day_start = datetime.combine(at.date(), datetime.min.time())
+    first_slot = (at.hour * 60 + at.minute) // 30
+    return [
+        RoomForecast(
+            room_id=room.id,
+            room_name=room.name,
+            slots=[
+                SlotForecast(
+                    start=day_start + timedelta(minutes=30 * slot),
+                    reserved=bool(reserved[i, slot]),
+                    occupancy_probability=round(float(probabilities[i, slot]), 4),
+                    free_probability=round(float(free[i, slot]), 4),
+                )
+                for slot in range(first_slot, SLOTS_PER_DAY)
+            ],
+        )
+        for i, room in enumerate(rooms)
+    ]
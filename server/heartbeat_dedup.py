@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class DeviceDedupWindow:
+    """
+    Bounded in-memory record of the heartbeat keys recently processed per device.
+
+    Each device keeps its last max_keys_per_device keys, and only the
+    max_devices most recently active devices are tracked, so memory stays bounded
+    no matter how many retries or devices show up.
+    """
+
+    def __init__(self, max_keys_per_device: int = 128, max_devices: int = 4096):
+        self.max_keys_per_device = max_keys_per_device
+        self.max_devices = max_devices
+        self._windows: OrderedDict[str, OrderedDict[str, None]] = OrderedDict()
+        self._lock = Lock()
+
+    def seen(self, mac_address: str, key: str) -> bool:
+        """Check whether a heartbeat key was already processed for this device"""
+        with self._lock:
+            window = self._windows.get(mac_address)
+            return window is not None and key in window
+
+    def remember(self, mac_address: str, key: str):
+        """Record a processed heartbeat key, evicting the oldest ones when full"""
+        with self._lock:
+            window = self._windows.get(mac_address)
+            if window is None:
+                window = OrderedDict()
+                self._windows[mac_address] = window
+                if len(self._windows) > self.max_devices:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(mac_address)
+
+            window[key] = None
+            window.move_to_end(key)
+            if len(window) > self.max_keys_per_device:
+                window.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+def heartbeat_key(
+    idempotency_key: str | None,
+    seq: int | None,
+    boot: str | None = None,
+    ts: int | None = None,
+) -> str | None:
+    """
+    Derive the deduplication key of a heartbeat, if the device sent one.
+
+    Sequence numbers restart when a device reboots, so they only identify a
+    heartbeat together with the device's boot id or the reading's timestamp; a
+    bare sequence number is not deduplicated.
+    """
+    if idempotency_key:
+        return f"key:{idempotency_key}"
+    if seq is None or (boot is None and ts is None):
+        return None
+    if boot is not None:
+        return f"seq:{boot}:{seq}"
+    return f"seq:{seq}@{ts}"
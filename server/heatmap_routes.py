@@ -0,0 +1,205 @@
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Integer, cast, func
+from sqlmodel import Session, select
+
+router = APIRouter(prefix="/heatmap", tags=["heatmap"])
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class OccupancyHeatmap:
+    """
+    Occupancy counts per room x weekday x half-hour slot of the opening hours.
+
+    Two count matrices (occupied readings and all readings) are updated
+    incrementally as readings are ingested, so reads cost O(matrix size) instead of
+    O(number of logs). rebuild() recomputes them from history with one GROUP BY
+    query.
+    """
+
+    def __init__(self, first_hour: int = 8, last_hour: int = 23):
+        self.first_hour = first_hour
+        self.slot_count = (last_hour - first_hour) * 2
+        self.room_index: dict[int, int] = {}
+        self.occupied = np.zeros((0, 7, self.slot_count), dtype=np.int64)
+        self.readings = np.zeros((0, 7, self.slot_count), dtype=np.int64)
+        self._lock = Lock()
+
+    def slot_labels(self) -> list[str]:
+        return [
+            f"{self.first_hour + slot // 2:02d}:{(slot % 2) * 30:02d}"
+            for slot in range(self.slot_count)
+        ]
+
+    def _slot_of(self, timestamp: datetime) -> int | None:
+        minutes = (timestamp.hour - self.first_hour) * 60 + timestamp.minute
+        slot = minutes // 30
+        return slot if 0 <= slot < self.slot_count else None
+
+    def _index_of(self, room_id: int) -> int:
+        """Matrix row of a room, growing the matrices for unseen rooms"""
+        index = self.room_index.get(room_id)
+        if index is None:
+            index = len(self.room_index)
+            self.room_index[room_id] = index
+            padding = np.zeros((1, 7, self.slot_count), dtype=np.int64)
+            self.occupied = np.concatenate((self.occupied, padding))
+            self.readings = np.concatenate((self.readings, padding))
+        return index
+
+    def record(
+        self,
+        room_id: int,
+        readings: list[tuple[datetime, bool]],
+        stored: dict[datetime, bool] | None = None,
+        merge: bool = True,
+    ):
+        """
+        Add ingested readings of a room to the counts.
+
+        Readings are merged like the log upsert merges them: one reading per
+        timestamp, occupied if any says so. `stored` holds the room's readings
+        already stored (and counted) at these timestamps with their stored value;
+        they are not counted again, only their occupied count is updated to the
+        merged value (or to the new one without merge, for rewritten logs).
+        """
+        stored = stored or {}
+        merged: dict[datetime, bool] = {}
+        for timestamp, occupied in readings:
+            merged[timestamp] = merged.get(timestamp, False) or occupied
+
+        with self._lock:
+            index = self._index_of(room_id)
+            for timestamp, occupied in merged.items():
+                slot = self._slot_of(timestamp)
+                if slot is None:
+                    continue
+                if timestamp in stored:
+                    final = occupied or (merge and stored[timestamp])
+                    self.occupied[index, timestamp.weekday(), slot] += int(final) - int(
+                        stored[timestamp]
+                    )
+                    continue
+                self.readings[index, timestamp.weekday(), slot] += 1
+                if occupied:
+                    self.occupied[index, timestamp.weekday(), slot] += 1
+
+    def rebuild(self, session: Session, model) -> int:
+        """
+        Recompute the counts from the readings stored in model with one GROUP BY
+        query, returning the number of readings counted.
+
+        The lock is held throughout, so readings recorded meanwhile are not lost
+        when the counts are replaced.
+        """
+        minutes = (
+            cast(func.strftime("%H", model.timestamp), Integer) * 60
+            + cast(func.strftime("%M", model.timestamp), Integer)
+            - self.first_hour * 60
+        )
+        # strftime's %w counts from Sunday, Python's weekday() from Monday
+        weekday = (cast(func.strftime("%w", model.timestamp), Integer) + 6) % 7
+        slot = minutes // 30
+        statement = (
+            select(
+                model.itemId,
+                weekday,
+                slot,
+                func.count(),
+                func.sum(cast(model.occupied, Integer)),
+            )
+            .where(minutes >= 0, minutes < self.slot_count * 30)
+            .group_by(model.itemId, weekday, slot)
+        )
+
+        with self._lock:
+            groups = session.exec(statement).all()
+            rooms = sorted({group[0] for group in groups})
+            room_index = {room: i for i, room in enumerate(rooms)}
+            shape = (len(rooms), 7, self.slot_count)
+            readings = np.zeros(shape, dtype=np.int64)
+            occupied = np.zeros(shape, dtype=np.int64)
+            for room, day, slot, count, occupied_count in groups:
+                readings[room_index[room], day, slot] = count
+                occupied[room_index[room], day, slot] = occupied_count
+            self.room_index = room_index
+            self.readings = readings
+            self.occupied = occupied
+        return int(readings.sum())
+
+    def rates(self, room_id: int | None = None) -> dict[int, list[list[float | None]]]:
+        """Fraction of occupied readings per weekday/slot, None where no data"""
+        with self._lock:
+            room_index = dict(self.room_index)
+            occupied = self.occupied.copy()
+            readings = self.readings.copy()
+
+        if room_id is not None:
+            room_index = {room_id: room_index[room_id]} if room_id in room_index else {}
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = np.round(occupied / readings, 4)
+        return {
+            room: [
+                [None if np.isnan(rate) else float(rate) for rate in day]
+                for day in rates[index]
+            ]
+            for room, index in room_index.items()
+        }
+
+
+heatmap = OccupancyHeatmap()
+
+
+def rebuild_heatmap(session: Session):
+    """Rebuild the heatmap counts from every stored occupancy reading"""
+    from main import HEATMAP_LOG_MODEL
+
+    counted = heatmap.rebuild(session, HEATMAP_LOG_MODEL)
+    print(f"Heatmap rebuilt from {counted} occupancy logs")
+
+
+class Heatmap(BaseModel):
+    weekdays: list[str]
+    slots: list[str]
+    # room id -> weekday -> slot -> fraction of occupied readings
+    rooms: dict[int, list[list[float | None]]]
+
+
+@router.get("/", response_model=Heatmap)
+async def get_heatmap():
+    """Get the occupancy heatmap of every room"""
+    return Heatmap(
+        weekdays=WEEKDAYS, slots=heatmap.slot_labels(), rooms=heatmap.rates()
+    )
+
+
+@router.get("/{room_id}", response_model=Heatmap)
+async def get_room_heatmap(room_id: int):
+    """Get the occupancy heatmap of one room"""
+    rooms = heatmap.rates(room_id)
+    if not rooms:
+        raise HTTPException(status_code=404, detail="No occupancy data for this room")
+    return Heatmap(weekdays=WEEKDAYS, slots=heatmap.slot_labels(), rooms=rooms)
+
+
+@router.post("/rebuild")
+def rebuild(session: Session = SessionDep):
+    """Recompute the heatmap from the stored occupancy history"""
+    rebuild_heatmap(session)
+    return {"message": "Heatmap rebuilt"}
@@ -0,0 +1,298 @@
+"""
+Bulk import of historical occupancy readings from CSV or NDJSON files.
+
+Records are streamed through a generator pipeline (read, parse, chunk) and
+upserted into OccupancyLog with one executemany per chunk, each chunk in its own
+transaction, so only one chunk of readings is in memory at a time. Afterwards the
+imported range of every room is run through the room's smoothing stage into
+SmoothedOccupancyLog, and its slots are created and marked occupied from it with
+two set-based statements per room (slots already occupied stay so).
+
+Each record has a timestamp (ISO 8601, naive times are local, or unix seconds),
+occupied (1/0/true/false) and either itemId or macAddress (of a known unit).
+Files ending in .gz are decompressed on the fly.
+
+Running servers pick the history up in their heatmap and forecast on their next
+restart or precompute.
+
+CLI (from the server directory):
+    python history_import.py history-2025-*.csv.gz
+    python history_import.py --format ndjson --chunk-size 20000 export.log
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from sqlalchemy import exists, func, insert, literal, update
+from sqlmodel import Session, select
+
+from models import Unit
+from smoothing_routes import load_overrides
+
+CHUNK_SIZE = 50_000
+# Invalid records reported individually before only counting them
+MAX_REPORTED_ERRORS = 20
+TRUE_VALUES = {"1", "true", "yes", "occupied"}
+FALSE_VALUES = {"0", "false", "no", "unoccupied", ""}
+
+Reading = tuple[int, datetime, bool]
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        # Room -> (first, last) imported timestamp
+        self.ranges: dict[int, tuple[datetime, datetime]] = {}
+
+    def add(self, chunk: list[Reading]):
+        self.imported += len(chunk)
+        for item_id, timestamp, _ in chunk:
+            first, last = self.ranges.get(item_id, (timestamp, timestamp))
+            self.ranges[item_id] = (min(first, timestamp), max(last, timestamp))
+
+    def reject(self, source: str, error: str):
+        self.rejected += 1
+        if self.rejected <= MAX_REPORTED_ERRORS:
+            print(f"Skipping {source}: {error}")
+
+    def rate(self) -> float:
+        return self.imported / max(time.perf_counter() - self.started, 1e-9)
+
+
+def open_text(path: Path) -> io.TextIOBase:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def file_format(path: Path) -> str:
+    suffixes = [suffix for suffix in path.suffixes if suffix != ".gz"]
+    if suffixes and suffixes[-1] in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "csv"
+
+
+def read_records(
+    paths: list[Path], format: str | None = None
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Records of every file in order, with their "file:line" for error messages"""
+    for path in paths:
+        with open_text(path) as f:
+            if (format or file_format(path)) == "csv":
+                reader = csv.DictReader(f)
+                for record in reader:
+                    yield f"{path}:{reader.line_num}", record
+                continue
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield f"{path}:{number}", json.loads(line)
+                    except ValueError:
+                        yield f"{path}:{number}", {}
+
+
+def parse_timestamp(value: Any) -> datetime:
+    if isinstance(value, (int, float)) or str(value).replace(".", "", 1).isdigit():
+        return datetime.fromtimestamp(float(value))
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parse_occupied(value: Any) -> bool:
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"invalid occupied value {value!r}")
+
+
+def parse_readings(
+    records: Iterable[tuple[str, dict[str, Any]]],
+    rooms_by_mac: dict[str, int],
+    stats: ImportStats,
+) -> Iterator[Reading]:
+    for source, record in records:
+        stats.read += 1
+        try:
+            if record.get("itemId") not in (None, ""):
+                item_id = int(record["itemId"])
+            elif record.get("macAddress") in rooms_by_mac:
+                item_id = rooms_by_mac[record["macAddress"]]
+            else:
+                raise ValueError("no itemId or known macAddress")
+            timestamp = parse_timestamp(record["timestamp"])
+            occupied = parse_occupied(record.get("occupied"))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError) as e:
+            stats.reject(source, str(e))
+            continue
+        yield item_id, timestamp, occupied
+
+
+def chunked(readings: Iterable[Reading], size: int) -> Iterator[list[Reading]]:
+    chunk = []
+    for reading in readings:
+        chunk.append(reading)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_logs(session: Session, chunks: Iterable[list[Reading]], stats: ImportStats):
+    """Upsert raw logs, one executemany and one transaction per chunk"""
+    from main import upsert_occupancy_logs
+
+    for chunk in chunks:
+        upsert_occupancy_logs(
+            session,
+            [
+                {"itemId": item_id, "timestamp": timestamp, "occupied": occupied}
+                for item_id, timestamp, occupied in chunk
+            ],
+        )
+        session.commit()
+        stats.add(chunk)
+        print(f"{stats.imported} readings imported ({stats.rate():.0f}/s)")
+
+
+def smooth_range(
+    session: Session, item_id: int, first: datetime, last: datetime, chunk_size: int
+) -> int:
+    """
+    Rewrite the smoothed logs of a room over [first, last] from its raw logs.
+
+    Uses the room's smoothing override if it has one (loaded from the database),
+    continuing from the smoothed state before `first` but apart from the live
+    state of a running server.
+    """
+    from main import SmoothedOccupancyLog, smooth_stored_range
+
+    rows = [
+        {"itemId": item_id, "timestamp": timestamp, "occupied": occupied}
+        for timestamp, occupied in smooth_stored_range(session, item_id, first, last)
+    ]
+    for start in range(0, len(rows), chunk_size):
+        session.execute(
+            insert(SmoothedOccupancyLog).prefix_with("OR REPLACE"),
+            rows[start : start + chunk_size],
+        )
+    session.commit()
+    return len(rows)
+
+
+def recompute_slots(session: Session, item_id: int, first: datetime, last: datetime):
+    """
+    Create missing slots and mark the slots of a room's imported range occupied
+    where its smoothed logs are, set-based. The finished ones are queued for
+    (re)classification, as their outcome may predate the imported readings.
+    """
+    from main import Slot, SmoothedOccupancyLog, get_slot_bounds, slot_start_sql
+    from outcome_routes import mark_pending
+
+    range_start, _ = get_slot_bounds(first)
+    _, range_end = get_slot_bounds(last)
+    in_range = (
+        SmoothedOccupancyLog.itemId == item_id,
+        SmoothedOccupancyLog.timestamp >= range_start,
+        SmoothedOccupancyLog.timestamp < range_end,
+    )
+
+    slot_start = slot_start_sql(SmoothedOccupancyLog.timestamp)
+    slot_end = func.strftime("%Y-%m-%d %H:%M:%S.000000", slot_start, "+30 minutes")
+    session.execute(
+        insert(Slot)
+        .prefix_with("OR IGNORE")
+        .from_select(
+            ["itemId", "start", "end", "reserved", "occupied"],
+            select(
+                literal(item_id), slot_start, slot_end, literal(False), literal(False)
+            )
+            .where(*in_range)
+            .distinct(),
+        )
+    )
+
+    # Only raised: a slot may be occupied by readings outside the import, e.g. live
+    # ones of a running server
+    occupied = exists().where(
+        SmoothedOccupancyLog.itemId == Slot.itemId,
+        SmoothedOccupancyLog.timestamp >= Slot.start,
+        SmoothedOccupancyLog.timestamp < Slot.end,
+        SmoothedOccupancyLog.occupied == True,
+    )
+    session.execute(
+        update(Slot)
+        .where(
+            Slot.itemId == item_id,
+            Slot.start >= range_start,
+            Slot.start < range_end,
+            Slot.occupied == False,
+        )
+        .values(occupied=occupied)
+    )
+
+    current_start, _ = get_slot_bounds(datetime.now())
+    starts = session.exec(select(slot_start).where(*in_range).distinct()).all()
+    mark_pending(session, item_id, [start for start in starts if start < current_start])
+    session.commit()
+
+
+def run_import(
+    paths: list[Path], format: str | None = None, chunk_size: int = CHUNK_SIZE
+) -> ImportStats:
+    from main import create_db_and_tables, engine
+
+    create_db_and_tables()
+    stats = ImportStats()
+    with Session(engine) as session:
+        load_overrides(session)
+        rooms_by_mac = dict(session.exec(select(Unit.macAddress, Unit.roomId)).all())
+        readings = parse_readings(read_records(paths, format), rooms_by_mac, stats)
+        import_logs(session, chunked(readings, chunk_size), stats)
+        imported_seconds = time.perf_counter() - stats.started
+
+        for item_id, (first, last) in sorted(stats.ranges.items()):
+            smoothed = smooth_range(session, item_id, first, last, chunk_size)
+            recompute_slots(session, item_id, first, last)
+            print(f"Room {item_id}: {smoothed} smoothed readings, slots recomputed")
+
+    total_seconds = time.perf_counter() - stats.started
+    print(
+        f"Imported {stats.imported} of {stats.read} readings "
+        f"({stats.rejected} rejected) for {len(stats.ranges)} rooms in "
+        f"{total_seconds:.1f}s: {stats.imported / max(imported_seconds, 1e-9):.0f} "
+        f"readings/s inserted, {stats.imported / max(total_seconds, 1e-9):.0f} "
+        f"readings/s overall"
+    )
+    return stats
+
+
+def run_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        help="format of every file (default: from each file's extension)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    run_import(args.files, args.format, args.chunk_size)
+
+
+if __name__ == "__main__":
+    run_cli()
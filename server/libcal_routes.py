@@ -0,0 +1,331 @@
+import asyncio
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Annotated
+
+import httpx
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+router = APIRouter(prefix="/libcal", tags=["libcal"])
+
+LIBCAL_BASE_URL = os.environ.get(
+    "FOMO_LIBCAL_URL", "https://concordiauniversity.libcal.com"
+)
+LOCATIONS_FILE = Path(
+    os.environ.get(
+        "FOMO_LIBCAL_LOCATIONS", Path(__file__).parent / "libcal_locations.json"
+    )
+)
+
+# Locations fetched at the same time over the shared client
+MAX_CONCURRENT_FETCHES = 4
+REQUEST_TIMEOUT_SECONDS = 10
+# Attempts per location and refresh, waiting RETRY_BACKOFF_SECONDS (doubled after
+# each failed attempt, with jitter) in between
+FETCH_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.5
+# Consecutive failed refreshes before a location's breaker opens, and how long it
+# stays open (doubled for each further failure)
+FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = timedelta(hours=6)
+MAX_BREAKER_COOLDOWN = timedelta(days=1)
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class LibCalRoom(BaseModel):
+    id: int
+    name: str
+    code: str
+
+
+class LibCalLocation(BaseModel):
+    name: str
+    building: str
+    lid: int
+    gid: int
+    slug: str
+    rooms: list[LibCalRoom]
+
+
+def load_locations(path: Path = LOCATIONS_FILE) -> list[LibCalLocation]:
+    with open(path) as f:
+        return [LibCalLocation(**location) for location in json.load(f)]
+
+
+locations = load_locations()
+
+
+class LocationBreaker:
+    """
+    Circuit breaker of one location.
+
+    After FAILURE_THRESHOLD consecutive failed refreshes the location is skipped
+    until its cooldown ends, then one refresh is let through (half-open): success
+    closes the breaker, failure opens it again for twice as long.
+    """
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.open_until: datetime | None = None
+        self.last_success: datetime | None = None
+        self.last_error: str | None = None
+        self.last_slot_count = 0
+
+    def state(self, now: datetime) -> str:
+        if self.open_until is None:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def allow(self, now: datetime) -> bool:
+        return self.state(now) != "open"
+
+    def record_success(self, now: datetime, slot_count: int):
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.last_success = now
+        self.last_error = None
+        self.last_slot_count = slot_count
+
+    def record_failure(self, now: datetime, error: str):
+        self.consecutive_failures += 1
+        self.last_error = error
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            cooldown = BREAKER_COOLDOWN * 2 ** (
+                self.consecutive_failures - FAILURE_THRESHOLD
+            )
+            self.open_until = now + min(cooldown, MAX_BREAKER_COOLDOWN)
+
+
+breakers: dict[str, LocationBreaker] = {
+    location.name: LocationBreaker() for location in locations
+}
+
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Client shared by every location, kept open between refreshes"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_grid(
+    client: httpx.AsyncClient, location: LibCalLocation, day: date
+) -> list[dict]:
+    """Fetch the availability grid of one location for one day"""
+    headers = {
+        "referer": f"{LIBCAL_BASE_URL}/reserve/{location.slug}",
+        "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+    }
+    data = {
+        "lid": str(location.lid),
+        "gid": str(location.gid),
+        "eid": "-1",
+        "seat": "0",
+        "seatId": "0",
+        "zone": "0",
+        "start": day.isoformat(),
+        "end": (day + timedelta(days=1)).isoformat(),
+        "pageIndex": "0",
+        "pageSize": str(len(location.rooms)),
+    }
+    response = await client.post(
+        f"{LIBCAL_BASE_URL}/spaces/availability/grid", headers=headers, data=data
+    )
+    response.raise_for_status()
+    return response.json().get("slots", [])
+
+
+async def fetch_with_retries(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    location: LibCalLocation,
+    day: date,
+) -> list[dict]:
+    """Fetch a location's grid, retrying with exponential backoff"""
+    for attempt in range(FETCH_ATTEMPTS):
+        try:
+            async with semaphore:
+                return await fetch_grid(client, location, day)
+        except (httpx.HTTPError, ValueError):
+            if attempt == FETCH_ATTEMPTS - 1:
+                raise
+        # Back off outside the semaphore so other locations keep going
+        delay = RETRY_BACKOFF_SECONDS * 2**attempt
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+def upsert_slots(session: Session, rows: list[dict]):
+    """
+    Insert fetched slots, updating only the reservation state of known ones.
+
+    Finished slots whose reservation changed are queued for reclassification,
+    as their outcome was classified with the previous one (see outcome_routes).
+    """
+    from main import Slot
+    from outcome_routes import mark_pending
+
+    if not rows:
+        return
+    now = datetime.now()
+    finished = [row for row in rows if row["end"] <= now]
+    if finished:
+        statement = select(Slot.itemId, Slot.start, Slot.reserved).where(
+            Slot.itemId.in_({row["itemId"] for row in finished}),
+            Slot.start >= min(row["start"] for row in finished),
+            Slot.start <= max(row["start"] for row in finished),
+        )
+        stored = {
+            (room_id, start): reserved
+            for room_id, start, reserved in session.exec(statement)
+        }
+        changed: dict[int, list[datetime]] = {}
+        for row in finished:
+            if stored.get((row["itemId"], row["start"])) != row["reserved"]:
+                changed.setdefault(row["itemId"], []).append(row["start"])
+        for room_id, starts in changed.items():
+            mark_pending(session, room_id, starts)
+
+    statement = sqlite_insert(Slot)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Slot.itemId, Slot.start, Slot.end],
+        set_={"reserved": statement.excluded.reserved},
+    )
+    session.execute(statement, rows)
+    session.commit()
+
+
+async def refresh_locations(session: Session, day: date | None = None):
+    """
+    Refresh the slots of every location whose breaker allows it, concurrently.
+
+    A location that fails keeps its last good grid in the database, which is what
+    the rest of the app keeps serving until LibCal answers again.
+    """
+    if day is None:
+        day = date.today()
+    now = datetime.now()
+    due = [location for location in locations if breakers[location.name].allow(now)]
+    for location in locations:
+        if location not in due:
+            print(f"Skipping LibCal location {location.name}: circuit open")
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    client = get_client()
+    results = await asyncio.gather(
+        *(fetch_with_retries(client, semaphore, location, day) for location in due),
+        return_exceptions=True,
+    )
+
+    rows = []
+    fetched = 0
+    now = datetime.now()
+    for location, result in zip(due, results):
+        breaker = breakers[location.name]
+        if isinstance(result, Exception):
+            breaker.record_failure(now, repr(result))
+            print(f"Error fetching slots of {location.name}:", repr(result))
+            continue
+        try:
+            location_rows = [
+                {
+                    "itemId": slot["itemId"],
+                    "start": datetime.fromisoformat(slot["start"]),
+                    "end": datetime.fromisoformat(slot["end"]),
+                    "reserved": "className" in slot,
+                    "occupied": False,
+                }
+                for slot in result
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            breaker.record_failure(now, f"Malformed grid: {e!r}")
+            print(f"Malformed slots from {location.name}:", repr(e))
+            continue
+        breaker.record_success(now, len(location_rows))
+        rows.extend(location_rows)
+        fetched += 1
+
+    upsert_slots(session, rows)
+    print(
+        f"Fetched {len(rows)} slots for {day} from {fetched}/{len(locations)} "
+        "LibCal locations"
+    )
+
+
+class LocationStatus(BaseModel):
+    name: str
+    building: str
+    state: str
+    consecutive_failures: int
+    open_until: datetime | None
+    last_success: datetime | None
+    last_error: str | None
+    last_slot_count: int
+
+
+@router.get("/locations", response_model=list[LocationStatus])
+async def get_location_status():
+    """Ingestion health of every configured LibCal location"""
+    now = datetime.now()
+    return [
+        LocationStatus(
+            name=location.name,
+            building=location.building,
+            state=breakers[location.name].state(now),
+            consecutive_failures=breakers[location.name].consecutive_failures,
+            open_until=breakers[location.name].open_until,
+            last_success=breakers[location.name].last_success,
+            last_error=breakers[location.name].last_error,
+            last_slot_count=breakers[location.name].last_slot_count,
+        )
+        for location in locations
+    ]
+
+
+class RoomSync(BaseModel):
+    added: int
+
+
+@router.post("/locations/rooms", response_model=RoomSync)
+def sync_location_rooms(
+    user_id: Annotated[int, Query()], session: Session = SessionDep
+):
+    """Add the configured rooms missing from the database (admins only)"""
+    from analytics_routes import require_admin
+    from models import populate_initial_rooms
+
+    require_admin(session, user_id)
+    added = populate_initial_rooms(session, sync=True)
+    if added:
+        import availability_routes
+
+        availability_routes.rebuild_index(session)
+    return RoomSync(added=added)
@@ -1,25 +1,69 @@
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Header
-from fastapi.responses import FileResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Header, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from sqlmodel import Field, Session, SQLModel, create_engine, select
-from fastapi_utils.tasks import repeat_every
-import httpx
-from datetime import timedelta, date
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    case,
+    cast,
+    event,
+    func,
+    insert,
+    or_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import timedelta
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
 import os
+import bisect
+import math
+import json
+import asyncio
+import msgpack
 
 # Import the User model and routers
-from models import Unit, User, Room, populate_initial_rooms
+from models import (
+    Unit,
+    User,
+    Room,
+    SlotOutcome,
+    SlotOutcomeType,
+    populate_initial_rooms,
+)
 import user_routes
 import auth_routes
 import room_routes
 import unit_routes
 import audio_routes
+import wire_format
+import heartbeat_dedup
+import device_limits
+import fleet_health
+from fleet_health import covered_by_gaps, outside_gaps, sensor_gaps
+import room_locks
+import occupancy_smoothing
+import smoothing_routes
+import timeseries_routes
+import heatmap_routes
+import forecast_routes
+import availability_routes
+import outcome_routes
+import opening_hours
+import libcal_routes
+import analytics_routes
+import scheduler_routes
+from scheduler_routes import scheduler
+from fast_json import RowsResponse, select_rows
+from opening_hours import OpeningHoursTable
 
 
 # Not peristed in DB
@@ -48,13 +92,43 @@ class OccupancyLog(SQLModel, table=True):
     occupied: bool
 
 
-sqlite_file_name = "database.db"
+# Effective occupancy after smoothing (see occupancy_smoothing), one per reading
+class SmoothedOccupancyLog(SQLModel, table=True):
+    itemId: int = Field(primary_key=True)
+    timestamp: datetime = Field(primary_key=True)
+    occupied: bool
+
+
+# Whether raw sensor readings are stored in OccupancyLog next to the smoothed ones
+KEEP_RAW_OCCUPANCY_LOGS = os.environ.get("FOMO_KEEP_RAW_LOGS", "1") == "1"
+
+OCCUPANCY_LOG_SOURCES = {"raw": OccupancyLog, "smoothed": SmoothedOccupancyLog}
+
+# Readings counted by the occupancy heatmap (raw unless raw logs are not kept)
+HEATMAP_LOG_MODEL = OccupancyLog if KEEP_RAW_OCCUPANCY_LOGS else SmoothedOccupancyLog
+
+
+sqlite_file_name = os.environ.get("FOMO_DATABASE", "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
+# Seconds a connection waits for another one's write lock before failing with
+# "database is locked"
+SQLITE_BUSY_TIMEOUT = 30
+
+connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}
 engine = create_engine(sqlite_url, connect_args=connect_args)
 
 
+@event.listens_for(engine, "connect")
+def configure_sqlite(dbapi_connection, _):
+    # Readers don't block the writer (and the other way around) with a write-ahead
+    # log, so concurrent /sync requests only wait for each other's writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
@@ -68,59 +142,11 @@ SessionDep = Annotated[Session, Depends(get_session)]
 
 
 async def refresh_todays_slots(session: Session):
-    """Refresh slots for today"""
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = {
-                "referer": "https://concordiauniversity.libcal.com/reserve/webster",
-                "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-            }
-            today = date.today()
-            data = {
-                "lid": "2161",
-                "gid": "5032",
-                "eid": "-1",
-                "seat": "0",
-                "seatId": "0",
-                "zone": "0",
-                "start": today.isoformat(),
-                "end": (today + timedelta(days=1)).isoformat(),
-                "pageIndex": "0",
-                "pageSize": "18",
-            }
-            response = await client.post(
-                "https://concordiauniversity.libcal.com/spaces/availability/grid",
-                headers=headers,
-                data=data,
-            )
-
-            slots = response.json().get("slots", [])
-            print(
-                f"Successfully fetched {len(slots)} slots using date {today} with status code: {response.status_code}"
-            )
-
-            for slot in slots:
-                new_slot = Slot(
-                    itemId=slot["itemId"],
-                    start=datetime.fromisoformat(slot["start"]),
-                    end=datetime.fromisoformat(slot["end"]),
-                    reserved=("className" in slot),
-                    occupied=False,
-                )
-                statement = select(Slot).where(
-                    Slot.itemId == new_slot.itemId,
-                    Slot.start == new_slot.start,
-                    Slot.end == new_slot.end,
-                )
-                existing_slot = session.exec(statement).first()
-                if existing_slot:
-                    new_slot.occupied = existing_slot.occupied
-                session.merge(new_slot)
-            session.commit()
-            print("Database updated with latest slots.")
-
-        except Exception as e:
-            print("Error fetching slots:", e)
+    """Refresh slots for today from every LibCal location (see libcal_routes)"""
+    try:
+        await libcal_routes.refresh_locations(session)
+    except Exception as e:
+        print("Error fetching slots:", e)
 
 
 app = FastAPI()
@@ -139,19 +165,96 @@ app.include_router(auth_routes.router)
 app.include_router(room_routes.router)
 app.include_router(unit_routes.router)
 app.include_router(audio_routes.router)
+app.include_router(smoothing_routes.router)
+app.include_router(timeseries_routes.router)
+app.include_router(heatmap_routes.router)
+app.include_router(forecast_routes.router)
+app.include_router(availability_routes.router)
+app.include_router(outcome_routes.router)
+app.include_router(libcal_routes.router)
+app.include_router(analytics_routes.router)
+app.include_router(scheduler_routes.router)
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    # Workers of a multi-worker deployment start at the same time
+    with scheduler_routes.file_lock(f"{sqlite_file_name}.startup.lock"):
+        create_db_and_tables()
+        with Session(engine) as session:
+            populate_initial_rooms(session)
+    with Session(engine) as session:
+        smoothing_routes.load_overrides(session)
+        heatmap_routes.rebuild_heatmap(session)
+        availability_routes.rebuild_index(session)
+        fleet_health.tracker.sync(session, datetime.now())
 
 
 @app.on_event("startup")
-@repeat_every(seconds=60 * 60 * 3)  # every 3 hours
+async def start_background_tasks():
+    asyncio.create_task(scheduler_routes.scheduler.run_forever())
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    with Session(engine) as session:
+        scheduler_routes.scheduler.release_lease(session)
+    await libcal_routes.close_client()
+
+
+# Background jobs (see scheduler_routes): cluster jobs run on the leader worker
+# only, local jobs refresh each worker's in-memory state
+
+
+@scheduler.job("refresh_slots", timedelta(hours=3))
 async def refresh_todays_slots_task():
     with Session(engine) as session:
         await refresh_todays_slots(session)
-        await populate_initial_rooms(session)
+        availability_routes.rebuild_index(session)
+
+
+@scheduler.job("classify_finished_slots", timedelta(minutes=1))
+def classify_finished_slots_task():
+    with Session(engine) as session:
+        outcome_routes.classify_finished_slots(session, datetime.now())
+
+
+@scheduler.job("rebuild_availability_index", timedelta(minutes=10), cluster=False)
+def rebuild_availability_index_task():
+    with Session(engine) as session:
+        availability_routes.rebuild_index(session)
+
+
+@scheduler.job("refresh_opening_hours", timedelta(minutes=10), cluster=False)
+def refresh_opening_hours_task():
+    opening_hours.calendar.refresh()
+
+
+@scheduler.job("precompute_forecast", timedelta(days=1), cluster=False)
+def precompute_forecast_task():
+    with Session(engine) as session:
+        forecast_routes.precompute_forecast(session)
+
+
+@scheduler.job("check_fleet_health", timedelta(minutes=1), cluster=False)
+def check_fleet_health_task():
+    # Also catches up with the heartbeats served by the other workers
+    with Session(engine) as session:
+        transitions = fleet_health.tracker.sync(session, datetime.now())
+    for mac_address, health in transitions:
+        print(f"Unit {mac_address} is {health.value}")
+
+
+@scheduler.job("load_smoothing_overrides", timedelta(minutes=1), cluster=False)
+def load_smoothing_overrides_task():
+    # Overrides changed through another worker
+    with Session(engine) as session:
+        smoothing_routes.load_overrides(session)
+
+
+@scheduler.job("export_analytics_snapshot", timedelta(days=1))
+def export_analytics_snapshot_task():
+    analytics_routes.export_if_stale(sqlite_file_name)
 
 
 @app.get("/")
@@ -191,163 +294,627 @@ async def get_my_sound():
     )
 
 
-@app.post("/sync")
-async def sync(
-    session: SessionDep,
-    occupied: int = Query(..., description="1 for occupied, 0 for unoccupied"),
-    x_device_mac: str = Header(..., alias="X-Device-MAC"),
-) -> RoomStatus:
+def find_unit(session: Session, mac_address: str) -> Unit | None:
+    """Look up the unit for a device MAC without modifying anything"""
+    statement = select(Unit).where(Unit.macAddress == mac_address)
+    return session.exec(statement).first()
 
-    # Get room_id from device MAC address
-    statement = select(Unit).where(Unit.macAddress == x_device_mac)
-    unit = session.exec(statement).first()
-    if not unit:
-        # create unit and assign random valid room id
-        assigned_room = session.exec(select(Room)).first()
-        if not assigned_room:
-            raise HTTPException(status_code=404, detail="No rooms available to assign")
-        room_id = assigned_room.id
-        unit = Unit(
-            macAddress=x_device_mac,
-            roomId=room_id,
-        )
-        session.add(unit)
-        session.commit()
-        session.refresh(unit)
-    else:
+
+def get_or_register_unit(session: Session, mac_address: str) -> Unit:
+    """
+    Look up the unit for a device MAC, registering unknown devices in the first room.
+
+    The lastSync update of a known unit is left for the caller's next commit, so a
+    heartbeat costs a single commit.
+    """
+    unit = find_unit(session, mac_address)
+    if unit:
         unit.lastSync = datetime.now()
         session.add(unit)
-        session.commit()
-        session.refresh(unit)
-        room_id = unit.roomId
+        return unit
 
-    occupied_bool = occupied == 1
-    now = datetime.now()
-    item_id = int(room_id)
+    # Devices with randomized or corrupted MACs would register a unit per call
+    if not device_limits.registrations.consume():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many unknown devices registering",
+            headers={
+                "Retry-After": str(math.ceil(device_limits.registrations.wait_time()))
+            },
+        )
 
-    occupancy_log = OccupancyLog(
-        itemId=item_id,
-        timestamp=now,
-        occupied=occupied_bool,
+    # create unit and assign random valid room id
+    assigned_room = session.exec(select(Room)).first()
+    if not assigned_room:
+        raise HTTPException(status_code=404, detail="No rooms available to assign")
+    unit = Unit(
+        macAddress=mac_address,
+        roomId=assigned_room.id,
     )
-    session.add(occupancy_log)
+    session.add(unit)
     session.commit()
+    session.refresh(unit)
+    return unit
 
-    start = now.replace(second=0, microsecond=0)
+
+def get_slot_bounds(dt: datetime) -> tuple[datetime, datetime]:
+    """Get the start and end of the 30 minute slot containing dt"""
+    start = dt.replace(second=0, microsecond=0)
     start = start.replace(minute=(start.minute // 30) * 30)
-    end = start + timedelta(minutes=30)
+    return start, start + timedelta(minutes=30)
+
+
+def slot_start_sql(timestamp):
+    """
+    SQL expression of the start of the 30 minute slot containing a timestamp
+    column, in SQLAlchemy's SQLite datetime format (see get_slot_bounds)
+    """
+    minute = cast(func.substr(timestamp, 15, 2), Integer)
+    start = (
+        func.substr(timestamp, 1, 14)
+        .concat(case((minute < 30, "00"), else_="30"))
+        .concat(":00.000000")
+    )
+    return type_coerce(start, DateTime)
+
+
+def build_room_status(
+    unit: Unit, now: datetime, currently_reserved: bool, accept: str | None = None
+) -> RoomStatus | Response:
+    """
+    Build the room status returned to a unit.
+
+    Units asking for a compact encoding through the Accept header get it straight
+    from the raw fields, skipping pydantic validation and serialization entirely.
+    """
+    _, end = get_slot_bounds(now)
+    fields = (
+        int(unit.roomId),
+        unit.room.name,
+        int(now.timestamp()),
+        currently_reserved,
+        is_currently_open(now, unit.room.building),
+        int(end.timestamp()) if currently_reserved else None,  # temporary
+        int(end.timestamp()),  # temporary
+    )
+
+    response = wire_format.room_status_response(fields, accept)
+    if response is not None:
+        return response
+
+    return RoomStatus(
+        room_id=fields[0],
+        room_name=fields[1],
+        current_time=fields[2],
+        currently_reserved=fields[3],
+        currently_open=fields[4],
+        current_reservation_ends=fields[5],
+        next_reservation_starts=fields[6],
+    )
+
 
+def is_currently_reserved(session: Session, item_id: int, now: datetime) -> bool:
     statement = select(Slot).where(
         Slot.itemId == item_id,
         Slot.start <= now,
         Slot.end >= now,
     )
     current_time_slot = session.exec(statement).first()
+    return bool(current_time_slot and current_time_slot.reserved)
+
+
+# Heartbeat keys (Idempotency-Key header, or sequence number with boot id or
+# timestamp) recently processed per device, so retried requests are answered
+# without any writes
+heartbeat_window = heartbeat_dedup.DeviceDedupWindow()
+
+
+def replay_heartbeat(
+    session: Session, x_device_mac: str, key: str | None, accept: str | None
+) -> RoomStatus | Response | None:
+    """Answer an already processed heartbeat from the database without writing"""
+    if key is None or not heartbeat_window.seen(x_device_mac, key):
+        return None
+    unit = find_unit(session, x_device_mac)
+    if not unit:
+        return None
+    now = datetime.now()
+    currently_reserved = is_currently_reserved(session, int(unit.roomId), now)
+    return build_room_status(unit, now, currently_reserved, accept)
+
+
+def process_heartbeats(
+    session: Session,
+    x_device_mac: str,
+    readings: list[tuple[datetime, bool]],
+    now: datetime,
+    key: str | None,
+    accept: str | None,
+) -> RoomStatus | Response:
+    """
+    Apply readings from one unit and build its room status.
+
+    Blocking, meant to run in a worker thread. A device's heartbeats are handled
+    one at a time, and slot/log updates are serialized per room so readings from
+    all units of a room are applied in order, while different rooms proceed in
+    parallel. Readings deferred from the device's rate-limited heartbeats are
+    applied along with them, and kept for the next heartbeat if this one fails.
+    """
+    with room_locks.device_locks.get(x_device_mac):
+        replayed = replay_heartbeat(session, x_device_mac, key, accept)
+        if replayed is not None:
+            return replayed
+
+        # Get room_id from device MAC address
+        unit = get_or_register_unit(session, x_device_mac)
+        item_id = int(unit.roomId)
+        fleet_health.tracker.record(x_device_mac, unit.id, item_id, now)
+
+        pending = device_limits.heartbeats.take_pending(x_device_mac)
+        with room_locks.room_locks.get(item_id):
+            try:
+                ingest_readings(session, item_id, pending + readings)
+                session.commit()
+            except Exception:
+                device_limits.heartbeats.restore_pending(x_device_mac, pending)
+                raise
+        if key is not None:
+            heartbeat_window.remember(x_device_mac, key)
+
+    currently_reserved = is_currently_reserved(session, item_id, now)
+    return build_room_status(unit, now, currently_reserved, accept)
+
+
+def check_device_rate(x_device_mac: str, deferred: tuple[datetime, bool] | None = None):
+    """
+    Reject heartbeats over the device's rate limit before any database work.
+
+    The reading of a rate-limited heartbeat, if given, is coalesced into the
+    device's next admitted heartbeat; quarantined devices' readings are dropped.
+    """
+    verdict, retry_after = device_limits.heartbeats.check(x_device_mac)
+    if verdict == device_limits.Verdict.ALLOWED:
+        return
+    if verdict == device_limits.Verdict.LIMITED and deferred is not None:
+        device_limits.heartbeats.defer(x_device_mac, deferred)
+    raise HTTPException(
+        status_code=429,
+        detail=(
+            "Device quarantined"
+            if verdict == device_limits.Verdict.QUARANTINED
+            else "Too many heartbeats"
+        ),
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+@app.post("/sync")
+def sync(
+    session: SessionDep,
+    occupied: int = Query(..., description="1 for occupied, 0 for unoccupied"),
+    seq: int | None = Query(None, description="Device sequence number"),
+    boot: str | None = Query(
+        None, description="Device boot id, scoping its sequence numbers"
+    ),
+    ts: int | None = Query(None, description="Device timestamp of the reading"),
+    x_device_mac: str = Header(..., alias="X-Device-MAC"),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    accept: str | None = Header(None),
+) -> RoomStatus:
+    now = datetime.now()
+    # Late readings (e.g. retried after a network error) are applied to the slot
+    # they were taken in rather than the current one
+    timestamp = parse_device_timestamp(ts, now) if ts is not None else now
+    check_device_rate(x_device_mac, (timestamp, occupied == 1))
+
+    return process_heartbeats(
+        session,
+        x_device_mac,
+        [(timestamp, occupied == 1)],
+        now,
+        heartbeat_dedup.heartbeat_key(idempotency_key, seq, boot, ts),
+        accept,
+    )
+
 
-    currently_reserved = False
+# Maximum number of readings accepted in a single /sync/batch upload
+MAX_BATCH_READINGS = 5000
+# How far ahead of the server clock a device timestamp may be (clock drift)
+MAX_READING_CLOCK_SKEW = timedelta(minutes=5)
+# Oldest reading a unit may upload after being offline
+MAX_READING_AGE = timedelta(days=7)
+# Readings older than this are past readings even for a room without live state
+LIVE_READING_AGE = timedelta(minutes=5)
 
-    if occupied_bool and current_time_slot and not current_time_slot.occupied:
-        # Only update if changing from unoccupied to occupied
-        current_time_slot.occupied = occupied == 1
-        session.add(current_time_slot)
-        session.commit()
-        session.refresh(current_time_slot)
-        print(
-            f"Updated occupancy for room {room_id} at {now} to {current_time_slot.occupied}"
+
+class SyncReading(BaseModel):
+    timestamp: int  # unix seconds, as reported by the device
+    occupied: int
+
+
+def parse_sync_readings(body: bytes, content_type: str) -> list[SyncReading]:
+    """
+    Decode a /sync/batch body into readings.
+
+    The body is either JSON or msgpack (Content-Type application/msgpack) and holds
+    an array of readings, each being a {"timestamp", "occupied"} object or a compact
+    [timestamp, occupied] pair.
+    """
+    try:
+        if "msgpack" in content_type:
+            payload = msgpack.unpackb(body)
+        else:
+            payload = json.loads(body)
+    except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError):
+        raise HTTPException(status_code=400, detail="Malformed batch body")
+
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Batch body must be an array")
+    if len(payload) > MAX_BATCH_READINGS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {MAX_BATCH_READINGS} readings",
         )
-        currently_reserved = current_time_slot.reserved
-    elif current_time_slot:
-        currently_reserved = current_time_slot.reserved
-    else:
-        new_slot = Slot(
-            itemId=item_id,
-            start=start,
-            end=end,
-            reserved=False,
-            occupied=occupied_bool,
+
+    readings = []
+    for index, item in enumerate(payload):
+        if isinstance(item, (list, tuple)) and len(item) == 2:
+            item = {"timestamp": item[0], "occupied": item[1]}
+        try:
+            reading = SyncReading.model_validate(item)
+        except ValidationError:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid reading at index {index}"
+            )
+        if reading.occupied not in (0, 1):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Invalid occupancy value at index {index}",
+            )
+        readings.append(reading)
+    return readings
+
+
+def parse_device_timestamp(
+    timestamp: int, now: datetime, index: int | None = None
+) -> datetime:
+    """Convert a device unix timestamp, rejecting values outside the accepted range"""
+    where = f" at index {index}" if index is not None else ""
+    try:
+        parsed = datetime.fromtimestamp(timestamp)
+    except (OverflowError, OSError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Invalid timestamp{where}")
+    if not now - MAX_READING_AGE <= parsed <= now + MAX_READING_CLOCK_SKEW:
+        raise HTTPException(
+            status_code=422, detail=f"Timestamp out of accepted range{where}"
         )
-        session.add(new_slot)
-        session.commit()
-        print(
-            f"Created new slot for room {item_id} at {now} with occupancy {new_slot.occupied}"
+    return parsed
+
+
+def upsert_occupancy_logs(
+    session: Session,
+    rows: list[dict],
+    model: type[OccupancyLog] | type[SmoothedOccupancyLog] = OccupancyLog,
+):
+    """
+    Insert occupancy logs with a single executemany.
+
+    Logs colliding on (itemId, timestamp), e.g. two units of the same room or a
+    retried reading, are merged: the room counts as occupied if any reading says so.
+    """
+    statement = sqlite_insert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.itemId, model.timestamp],
+        set_={"occupied": or_(model.occupied, statement.excluded.occupied)},
+    )
+    session.execute(statement, rows)
+
+
+def smooth_stored_range(
+    session: Session,
+    item_id: int,
+    first: datetime,
+    last: datetime,
+    readings: list[tuple[datetime, bool]] | None = None,
+) -> list[tuple[datetime, bool]]:
+    """
+    Smoothed readings of a room over [first, last] with its configuration, apart
+    from its live state: smoothing starts from the raw readings of the window and
+    the effective state just before first.
+
+    The stored raw readings of the range are used unless readings are given (when
+    raw logs are not kept).
+    """
+    config = occupancy_smoothing.smoother.config_for(item_id)
+    previous = session.exec(
+        select(SmoothedOccupancyLog.occupied)
+        .where(
+            SmoothedOccupancyLog.itemId == item_id,
+            SmoothedOccupancyLog.timestamp < first,
         )
-        currently_reserved = False
+        .order_by(SmoothedOccupancyLog.timestamp.desc())
+    ).first()
+
+    context = []
+    if readings is None:
+        in_range = (OccupancyLog.itemId == item_id, OccupancyLog.timestamp < first)
+        statement = select(OccupancyLog.timestamp, OccupancyLog.occupied)
+        context = session.exec(
+            statement.where(*in_range)
+            .order_by(OccupancyLog.timestamp.desc())
+            .limit(config.window - 1)
+        ).all()[::-1]
+        readings = session.exec(
+            statement.where(
+                OccupancyLog.itemId == item_id,
+                OccupancyLog.timestamp >= first,
+                OccupancyLog.timestamp <= last,
+            ).order_by(OccupancyLog.timestamp)
+        ).all()
+
+    effective = occupancy_smoothing.smoother.smooth_history(
+        item_id, [*context, *readings], bool(previous)
+    )[len(context) :]
+    return [
+        (timestamp, occupied) for (timestamp, _), occupied in zip(readings, effective)
+    ]
+
+
+def smooth_past_readings(
+    session: Session, item_id: int, readings: list[tuple[datetime, bool]]
+) -> list[tuple[datetime, bool]]:
+    """
+    Smooth past readings of a room apart from its live state and rewrite the
+    smoothed logs of their range.
 
-    return RoomStatus(
-        room_id=item_id,
-        room_name=unit.room.name,
-        current_time=int(now.timestamp()),
-        currently_reserved=currently_reserved,
-        currently_open=is_currently_open(now),
-        current_reservation_ends=(
-            int(end.timestamp()) if currently_reserved else None
-        ),  # temporary
-        next_reservation_starts=int(end.timestamp()),  # temporary
+    With raw logs kept, the range is re-smoothed from all stored readings in it
+    (see smooth_stored_range). Returns the smoothed readings written.
+    """
+    smoothed = smooth_stored_range(
+        session,
+        item_id,
+        readings[0][0],
+        readings[-1][0],
+        None if KEEP_RAW_OCCUPANCY_LOGS else readings,
     )
+    session.execute(
+        insert(SmoothedOccupancyLog).prefix_with("OR REPLACE"),
+        [
+            {"itemId": item_id, "timestamp": timestamp, "occupied": occupied}
+            for timestamp, occupied in smoothed
+        ],
+    )
+    return smoothed
+
 
+def ingest_readings(
+    session: Session, item_id: int, readings: list[tuple[datetime, bool]]
+) -> int:
+    """
+    Bulk insert occupancy readings for a room and update the affected slots.
+
+    Readings go through the room's smoothing stage first; raw logs (if kept) and
+    smoothed logs are upserted with one executemany each. Readings older than the
+    room's latest one are smoothed separately (see smooth_past_readings) and do
+    not reach the live occupancy or availability index; all readings are counted
+    by the heatmap. Every slot touched by a reading is created if missing, and slots with at least one effectively
+    occupied reading are marked occupied in one UPDATE. The caller is responsible
+    for committing and for holding the room's lock.
+
+    Returns:
+        Number of slots touched by the readings
+    """
+    if not readings:
+        return 0
 
-@app.get("/slots")
+    readings = sorted(readings)
+
+    # Readings older than the room's live state (late batches, replays) are
+    # smoothed on their own and do not change its current occupancy
+    live_after = datetime.now() - LIVE_READING_AGE
+    last_seen = occupancy_smoothing.smoother.last_seen(item_id)
+    if last_seen is not None:
+        live_after = max(live_after, last_seen)
+    past = [reading for reading in readings if reading[0] < live_after]
+    live = readings[len(past) :]
+
+    # Readings already stored (retries, other units of the room, re-uploaded
+    # batches) are merged or rewritten, and must not be counted again by the heatmap
+    stored = dict(
+        session.exec(
+            select(HEATMAP_LOG_MODEL.timestamp, HEATMAP_LOG_MODEL.occupied).where(
+                HEATMAP_LOG_MODEL.itemId == item_id,
+                HEATMAP_LOG_MODEL.timestamp >= readings[0][0],
+                HEATMAP_LOG_MODEL.timestamp <= readings[-1][0],
+            )
+        ).all()
+    )
+
+    if KEEP_RAW_OCCUPANCY_LOGS:
+        upsert_occupancy_logs(
+            session,
+            [
+                {"itemId": item_id, "timestamp": timestamp, "occupied": occupied}
+                for timestamp, occupied in readings
+            ],
+        )
+
+    smoothed = smooth_past_readings(session, item_id, past) if past else []
+    if KEEP_RAW_OCCUPANCY_LOGS:
+        heatmap_routes.heatmap.record(item_id, readings, stored)
+    elif smoothed:
+        # Smoothed logs of past readings are rewritten rather than merged
+        heatmap_routes.heatmap.record(item_id, smoothed, stored, merge=False)
+    if live:
+        live_smoothed = [
+            (
+                timestamp,
+                occupancy_smoothing.smoother.update(item_id, timestamp, occupied),
+            )
+            for timestamp, occupied in live
+        ]
+        upsert_occupancy_logs(
+            session,
+            [
+                {"itemId": item_id, "timestamp": timestamp, "occupied": occupied}
+                for timestamp, occupied in live_smoothed
+            ],
+            SmoothedOccupancyLog,
+        )
+        if not KEEP_RAW_OCCUPANCY_LOGS:
+            heatmap_routes.heatmap.record(item_id, live_smoothed, stored)
+        availability_routes.index.record_occupancy(item_id, *live_smoothed[-1])
+        smoothed += live_smoothed
+
+    # Slot start -> whether the room was effectively occupied during that slot
+    touched_slots: dict[datetime, bool] = {}
+    for timestamp, occupied in smoothed:
+        start, _ = get_slot_bounds(timestamp)
+        touched_slots[start] = touched_slots.get(start, False) or occupied
+
+    # Readings of finished slots (re)classify them, see outcome_routes
+    current_start, _ = get_slot_bounds(datetime.now())
+    outcome_routes.mark_pending(
+        session, item_id, [start for start in touched_slots if start < current_start]
+    )
+
+    statement = select(Slot.start).where(
+        Slot.itemId == item_id,
+        Slot.start.in_(touched_slots.keys()),
+    )
+    existing_starts = set(session.exec(statement).all())
+
+    missing_slots = [
+        {
+            "itemId": item_id,
+            "start": start,
+            "end": start + timedelta(minutes=30),
+            "reserved": False,
+            "occupied": occupied,
+        }
+        for start, occupied in touched_slots.items()
+        if start not in existing_starts
+    ]
+    if missing_slots:
+        session.execute(insert(Slot).prefix_with("OR IGNORE"), missing_slots)
+
+    occupied_starts = [
+        start
+        for start, occupied in touched_slots.items()
+        if occupied and start in existing_starts
+    ]
+    if occupied_starts:
+        session.execute(
+            update(Slot)
+            .where(
+                Slot.itemId == item_id,
+                Slot.start.in_(occupied_starts),
+                Slot.occupied == False,
+            )
+            .values(occupied=True)
+        )
+
+    return len(touched_slots)
+
+
+@app.post("/sync/batch")
+async def sync_batch(
+    request: Request,
+    session: SessionDep,
+    x_device_mac: str = Header(..., alias="X-Device-MAC"),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    accept: str | None = Header(None),
+) -> RoomStatus:
+    """
+    Upload many timestamped readings from one unit, e.g. after it was offline.
+
+    Accepts a JSON or msgpack array of readings (see parse_sync_readings) and
+    returns the current room status, like /sync (including its compact encodings).
+    Rate-limited uploads are rejected whole, for the unit to retry later.
+    """
+    check_device_rate(x_device_mac)
+    readings = parse_sync_readings(
+        await request.body(), request.headers.get("content-type", "")
+    )
+
+    now = datetime.now()
+    timed_readings = [
+        (parse_device_timestamp(reading.timestamp, now, index), reading.occupied == 1)
+        for index, reading in enumerate(readings)
+    ]
+
+    return await run_in_threadpool(
+        process_heartbeats,
+        session,
+        x_device_mac,
+        timed_readings,
+        now,
+        heartbeat_dedup.heartbeat_key(idempotency_key, None),
+        accept,
+    )
+
+
+@app.get("/slots", response_model=list[Slot])
 async def get_slots(
     session: SessionDep,
     start: Annotated[datetime, Query()],
     end: Annotated[datetime, Query()],
 ):
-    statement = select(Slot).where(
+    statement = select_rows(Slot).where(
         Slot.start >= start,
         Slot.end <= end,
     )
     results = session.exec(statement)
-    slots = results.all()
-    return slots
+    return RowsResponse(Slot, results.all())
 
 
-@app.get("/slots/{room_id}")
+@app.get("/slots/{room_id}", response_model=list[Slot])
 async def get_slots(
     room_id: str,
     session: SessionDep,
     start: Annotated[datetime, Query()],
     end: Annotated[datetime, Query()],
 ):
-    statement = select(Slot).where(
+    statement = select_rows(Slot).where(
         Slot.itemId == int(room_id),
         Slot.start >= start,
         Slot.end <= end,
     )
     results = session.exec(statement)
-    slots = results.all()
-    return slots
+    return RowsResponse(Slot, results.all())
 
 
-@app.get("/occupancy_logs")
+@app.get("/occupancy_logs", response_model=list[OccupancyLog])
 async def get_occupancy_logs(
     session: SessionDep,
     start: Annotated[datetime, Query()],
     end: Annotated[datetime, Query()],
 ):
-    statement = select(OccupancyLog).where(
+    statement = select_rows(OccupancyLog).where(
         OccupancyLog.timestamp >= start,
         OccupancyLog.timestamp <= end,
     )
     results = session.exec(statement)
-    logs = results.all()
-    return logs
+    return RowsResponse(OccupancyLog, results.all())
 
 
-@app.get("/occupancy_logs/{room_id}")
+@app.get(
+    "/occupancy_logs/{room_id}",
+    response_model=list[OccupancyLog],
+)
 async def get_occupancy_logs(
     room_id: str,
     session: SessionDep,
     start: Annotated[datetime, Query()],
     end: Annotated[datetime, Query()],
 ):
-    statement = select(OccupancyLog).where(
+    statement = select_rows(OccupancyLog).where(
         OccupancyLog.itemId == int(room_id),
         OccupancyLog.timestamp >= start,
         OccupancyLog.timestamp <= end,
     )
     results = session.exec(statement)
-    logs = results.all()
-    return logs
+    return RowsResponse(OccupancyLog, results.all())
 
 
 @app.get("/occupancy_logs/{room_id}/latest")
@@ -375,10 +942,13 @@ async def get_latest_occupancy_log(
 
 
 def calculate_occupancy_percentage(
-    logs: list[OccupancyLog], occupancy_window: int
+    logs: list[OccupancyLog],
+    occupancy_window: int,
+    hours: OpeningHoursTable | None = None,
+    masked: list[tuple[datetime, datetime]] | None = None,
 ) -> int:
     """
-    Calculate the percentage of time a room was occupied between 8 AM and 11 PM.
+    Calculate the percentage of opening hours a room was occupied.
 
     Each log indicates the room was occupied for at least the past occupancy_window minutes.
     Overlapping periods are merged to avoid double-counting.
@@ -386,10 +956,15 @@ def calculate_occupancy_percentage(
     Args:
         logs: List of OccupancyLog entries for a single room
         occupancy_window: Time window in minutes to consider a log as occupied (e.g., 5 minutes)
+        hours: Opening hours of the room's building (default building if None)
+        masked: Periods without a live sensor, left out of the available time
 
     Returns:
         Percentage of time occupied (0-100)
     """
+    if hours is None:
+        hours = opening_hours.calendar.for_building()
+
     # Filter to only occupied logs
     occupied_logs = [log for log in logs if log.occupied]
 
@@ -422,37 +997,32 @@ def calculate_occupancy_percentage(
     # Don't forget the last interval
     merged.append((current_start, current_end))
 
-    # Calculate total occupied minutes within 8 AM - 11 PM window
-    total_occupied_minutes = 0
-
-    for start, end in merged:
-        # For each day in the interval, clip to 8 AM - 11 PM
-        current_day = start.date()
-        end_day = end.date()
-
-        # Handle intervals that might span multiple days
-        day = current_day
-        while day <= end_day:
-            day_start = datetime.combine(day, datetime.min.time().replace(hour=8))
-            day_end = datetime.combine(day, datetime.min.time().replace(hour=23))
-
-            # Clip interval to this day's 8 AM - 11 PM window
-            clipped_start = max(start, day_start)
-            clipped_end = min(end, day_end)
-
-            if clipped_start < clipped_end:
-                duration = (clipped_end - clipped_start).total_seconds() / 60
-                total_occupied_minutes += duration
-
-            day += timedelta(days=1)
+    # Calculate total occupied minutes within opening hours, outside sensor gaps
+    # (an occupied reading's window may reach back into one)
+    total_occupied_minutes = sum(
+        hours.open_minutes_between(start, end)
+        for start, end in outside_gaps(merged, masked or [])
+    )
 
-    # Calculate total available minutes (15 hours per day)
-    # Determine how many days are covered
+    # Calculate total available minutes from the opening hours of each covered day
     first_log = min(log.timestamp for log in occupied_logs)
     last_log = max(log.timestamp for log in occupied_logs)
 
-    days_covered = (last_log.date() - first_log.date()).days + 1
-    total_available_minutes = days_covered * 15 * 60  # 15 hours = 900 minutes per day
+    total_available_minutes = 0
+    day = first_log.date()
+    while day <= last_log.date():
+        total_available_minutes += hours.minutes_on(day)
+        day += timedelta(days=1)
+    covered_start = datetime.combine(first_log.date(), datetime.min.time())
+    covered_end = datetime.combine(
+        last_log.date() + timedelta(days=1), datetime.min.time()
+    )
+    for gap_start, gap_end in masked or []:
+        total_available_minutes -= hours.open_minutes_between(
+            max(gap_start, covered_start), min(gap_end, covered_end)
+        )
+    if total_available_minutes <= 0:
+        return 0
 
     percentage = (total_occupied_minutes / total_available_minutes) * 100
     return round(percentage, 2)
@@ -515,42 +1085,32 @@ class RoomStats(BaseModel):
     ghostReservations: int
     averageStudySessionDuration: int
     intruders: int
+    sensorOutageMinutes: int
 
 
-EARLIEST_RESERVATION_HOURS = 8
-LATEST_RESERVATION_HOURS = 23
-
-
-def is_currently_open(dt: datetime = None) -> bool:
-    """Check if study rooms are currently open (8 AM to 11 PM)"""
+def is_currently_open(dt: datetime = None, building: str | None = None) -> bool:
+    """Check if the study rooms of a building are open (see opening_hours)"""
     if dt is None:
         dt = datetime.now()
-    return EARLIEST_RESERVATION_HOURS <= dt.hour < LATEST_RESERVATION_HOURS
+    return opening_hours.calendar.for_building(building).is_open(dt)
 
 
-def get_next_opening_time(dt: datetime = None) -> datetime:
-    """Get the next opening time (8 AM) after the given datetime"""
+def get_next_opening_time(
+    dt: datetime = None, building: str | None = None
+) -> datetime | None:
+    """Get the next opening time of a building after the given datetime"""
     if dt is None:
         dt = datetime.now()
-
-    if dt.hour < EARLIEST_RESERVATION_HOURS:
-        # Same day at 8 AM
-        return dt.replace(
-            hour=EARLIEST_RESERVATION_HOURS, minute=0, second=0, microsecond=0
-        )
-    else:
-        # Next day at 8 AM
-        next_day = dt.replace(
-            hour=EARLIEST_RESERVATION_HOURS, minute=0, second=0, microsecond=0
-        ) + timedelta(days=1)
-        return next_day
+    return opening_hours.calendar.for_building(building).next_opening(dt)
 
 
-def get_closing_time(dt: datetime = None) -> datetime:
-    """Get the closing time (11 PM) for the given datetime's date"""
+def get_closing_time(
+    dt: datetime = None, building: str | None = None
+) -> datetime | None:
+    """Get the closing time of a building on the given datetime's date (None if closed)"""
     if dt is None:
         dt = datetime.now()
-    return dt.replace(hour=LATEST_RESERVATION_HOURS, minute=0, second=0, microsecond=0)
+    return opening_hours.calendar.for_building(building).closing_time(dt)
 
 
 @app.get("/stats/{room_id}")
@@ -560,7 +1120,12 @@ async def get_occupancy_logs(
     start: Annotated[datetime, Query()],
     end: Annotated[datetime, Query()],
     occupancy_window: Annotated[int, Query()] = 5,
+    source: Annotated[Literal["raw", "smoothed"], Query()] = "raw",
 ) -> RoomStats:
+    log_model = OCCUPANCY_LOG_SOURCES[source]
+    room = session.get(Room, int(room_id))
+    hours = opening_hours.calendar.for_building(room.building if room else None)
+
     statement = select(Slot).where(
         Slot.itemId == int(room_id),
         Slot.start >= start,
@@ -569,18 +1134,23 @@ async def get_occupancy_logs(
     slot_results = session.exec(statement)
     slots: list[Slot] = slot_results.all()
 
-    statement = select(OccupancyLog).where(
-        OccupancyLog.itemId == int(room_id),
-        OccupancyLog.timestamp >= start,
-        OccupancyLog.timestamp <= end,
+    statement = select(log_model).where(
+        log_model.itemId == int(room_id),
+        log_model.timestamp >= start,
+        log_model.timestamp <= end,
     )
     results = session.exec(statement)
     logs: list[OccupancyLog] = results.all()
 
-    # Compute the percentage of time between 8 AM and 11 PM that the room is reserved
-    maximum_reservation_minutes = (
-        LATEST_RESERVATION_HOURS - EARLIEST_RESERVATION_HOURS
-    ) * 60
+    # Periods without readings had no live sensor: their occupancy is unknown, so
+    # they are left out of the occupancy percentage and ghost reservations
+    gaps = sensor_gaps(sorted(log.timestamp for log in logs), start, end)
+    sensor_outage_minutes = sum(
+        hours.open_minutes_between(gap_start, gap_end) for gap_start, gap_end in gaps
+    )
+
+    # Compute the percentage of opening hours in the range that the room is reserved
+    maximum_reservation_minutes = hours.open_minutes_between(start, end)
 
     total_reservation_minutes = 0
 
@@ -589,26 +1159,54 @@ async def get_occupancy_logs(
             # We assume each slot is 30 minutes
             total_reservation_minutes += 30
 
-    reserved_percentage = int(
-        (total_reservation_minutes / maximum_reservation_minutes) * 100
+    reserved_percentage = (
+        int((total_reservation_minutes / maximum_reservation_minutes) * 100)
+        if maximum_reservation_minutes
+        else 0
     )
 
     # Compute the percentage of time the room is occupied during the day
-    occupied_percentage = calculate_occupancy_percentage(logs, occupancy_window)
+    occupied_percentage = calculate_occupancy_percentage(
+        logs, occupancy_window, hours, gaps
+    )
+
+    # Slots classified once finished (see outcome_routes) are read from
+    # SlotOutcome, only the others are rescanned from the logs. Outcomes count raw
+    # readings, so they are not used for smoothed stats.
+    outcomes: list[SlotOutcome] = []
+    if source == "raw":
+        statement = select(SlotOutcome).where(
+            SlotOutcome.itemId == int(room_id),
+            SlotOutcome.start >= start,
+            SlotOutcome.end <= end,
+        )
+        outcomes = session.exec(statement).all()
+    classified_starts = {outcome.start for outcome in outcomes}
 
     # Compute the number of ghost reservations (assume each slot is 30 minutes and = 1 reservation)
     # i.e., the number of slots that are reserved but for which there is no corresponding occupied log
-    ghost_reservations = 0
+    ghost_reservations = sum(
+        1
+        for outcome in outcomes
+        if outcome.outcome == SlotOutcomeType.GHOST
+        and not covered_by_gaps(gaps, outcome.start, outcome.end)
+    )
 
+    # Sorted, so each slot is checked with a binary search instead of a scan of
+    # every log
+    occupied_timestamps = sorted(log.timestamp for log in logs if log.occupied)
     for slot in slots:
-        if slot.reserved:
+        if (
+            slot.reserved
+            and slot.start not in classified_starts
+            and not covered_by_gaps(gaps, slot.start, slot.end)
+        ):
             # Check if there are any occupied logs during this slot
-            slot_logs = [
-                log
-                for log in logs
-                if slot.start <= log.timestamp <= slot.end and log.occupied
-            ]
-            if not slot_logs:
+            first = bisect.bisect_left(occupied_timestamps, slot.start)
+            if (
+                first == len(occupied_timestamps)
+                or occupied_timestamps[first] > slot.end
+            ):
                 ghost_reservations += 1
 
     # Compute the average study session duration (in minutes) using the occupancy logs and occupancy_window
@@ -617,14 +1215,15 @@ async def get_occupancy_logs(
         logs, occupancy_window
     )
 
-    # Count the number of intruders (occupied logs during unreserved times between 11 PM and 8 AM)
-    intruders = 0
+    # Count the number of intruders (occupied logs outside opening hours)
+    intruders = sum(
+        outcome.occupiedReadings
+        for outcome in outcomes
+        if outcome.outcome == SlotOutcomeType.INTRUDED
+    )
     for log in logs:
-        if log.occupied:
-            if (
-                log.timestamp.hour < EARLIEST_RESERVATION_HOURS
-                or log.timestamp.hour >= LATEST_RESERVATION_HOURS
-            ):
+        if log.occupied and get_slot_bounds(log.timestamp)[0] not in classified_starts:
+            if not hours.is_open(log.timestamp):
                 intruders += 1
 
     return RoomStats(
@@ -633,4 +1232,5 @@ async def get_occupancy_logs(
         ghostReservations=ghost_reservations,
         averageStudySessionDuration=average_study_session_duration,
         intruders=intruders,
+        sensorOutageMinutes=int(sensor_outage_minutes),
     )
@@ -9,6 +9,20 @@ class UserType(str, Enum):
     ADMIN = "admin"
 
 
+class SlotOutcomeType(str, Enum):
+    GHOST = "ghost"  # reserved, nobody showed up
+    HONORED = "honored"  # reserved and occupied
+    INTRUDED = "intruded"  # occupied while the rooms are closed
+    WALK_IN = "walk_in"  # occupied without a reservation during opening hours
+    IDLE = "idle"  # neither reserved nor occupied
+
+
+class JobRunStatus(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(unique=True, index=True)
@@ -37,33 +51,84 @@ class Unit(SQLModel, table=True):
     room: Room = Relationship(back_populates="units")
 
 
+class SlotOutcome(SQLModel, table=True):
+    """Classification of a finished 30 minute slot"""
+
+    itemId: int = Field(primary_key=True)
+    start: datetime = Field(primary_key=True)
+    end: datetime
+    reserved: bool
+    outcome: SlotOutcomeType
+    occupiedReadings: int = Field(default=0)
+
+
+class PendingSlotOutcome(SQLModel, table=True):
+    """Finished slot that received readings and must be (re)classified"""
+
+    itemId: int = Field(primary_key=True)
+    start: datetime = Field(primary_key=True)
+
+
+class SmoothingOverride(SQLModel, table=True):
+    """Smoothing of a room overriding the default one (see occupancy_smoothing)"""
+
+    roomId: int = Field(primary_key=True)
+    window: int
+    threshold: int
+    min_dwell_seconds: int
+
+
+class SchedulerLease(SQLModel, table=True):
+    """Leader lease of the background scheduler, held by one worker at a time"""
+
+    name: str = Field(primary_key=True)
+    holder: str
+    expiresAt: datetime
+
+
+class JobRun(SQLModel, table=True):
+    """One run of a scheduled background job"""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job: str = Field(index=True)
+    worker: str
+    startedAt: datetime = Field(index=True)
+    finishedAt: Optional[datetime] = None
+    durationSeconds: Optional[float] = None
+    status: JobRunStatus
+    error: Optional[str] = None
+
+
 # Populate functions
 
 
-def populate_initial_rooms(session):
-    """Populate the database with initial rooms if none exist"""
-    existing_rooms = session.exec(select(Room)).all()
-    if not existing_rooms:
-        initial_rooms = [
-            Room(id=18508, name="Netherlands", code="LB 351", building="Webster"),
-            Room(id=18510, name="Brazil", code="LB 451", building="Webster"),
-            Room(id=18511, name="Lithuania", code="LB 547", building="Webster"),
-            Room(id=18512, name="Japan", code="LB 453", building="Webster"),
-            Room(id=18518, name="Linda Kay", code="LB 251", building="Webster"),
-            Room(id=18520, name="Croatia", code="LB 257", building="Webster"),
-            Room(id=18522, name="New Zealand", code="LB 259", building="Webster"),
-            Room(id=18523, name="Italy", code="LB 459", building="Webster"),
-            Room(id=18524, name="Ukraine", code="LB 518", building="Webster"),
-            Room(id=18525, name="South Africa", code="LB 520", building="Webster"),
-            Room(id=18526, name="Peru", code="LB 522", building="Webster"),
-            Room(id=18528, name="Poland", code="LB 583", building="Webster"),
-            Room(id=18529, name="Haiti", code="LB 311", building="Webster"),
-            Room(id=18530, name="Australia", code="LB 316", building="Webster"),
-            Room(id=18532, name="Syria", code="LB 327", building="Webster"),
-            Room(id=18533, name="Zimbabwe", code="LB 328", building="Webster"),
-            Room(id=18535, name="Kenya", code="LB 353", building="Webster"),
-            Room(id=18536, name="Vietnam", code="LB 359", building="Webster"),
-        ]
-        for room in initial_rooms:
-            session.add(room)
-        session.commit()
+def populate_initial_rooms(session, sync: bool = False) -> int:
+    """
+    Populate the database with the rooms of every configured LibCal location if
+    none exist.
+
+    With sync, also add the configured rooms missing from a populated database,
+    e.g. after configuring a new location; rooms deleted through the API come
+    back then. Returns the number of rooms added.
+    """
+    from libcal_routes import locations
+
+    existing_ids = set(session.exec(select(Room.id)).all())
+    if existing_ids and not sync:
+        return 0
+    added = 0
+    for location in locations:
+        for room in location.rooms:
+            if room.id not in existing_ids:
+                session.add(
+                    Room(
+                        id=room.id,
+                        name=room.name,
+                        code=room.code,
+                        building=location.building,
+                    )
+                )
+                existing_ids.add(room.id)
+                added += 1
+    session.commit()
+    return added
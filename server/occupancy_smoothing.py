@@ -0,0 +1,131 @@
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock
+
+from pydantic import BaseModel, model_validator
+
+
+class SmoothingConfig(BaseModel):
+    """
+    Debouncing applied to a room's raw occupancy readings.
+
+    The room becomes occupied once at least `threshold` of the last `window`
+    readings are occupied (k-of-n), and the effective state must have held for
+    `min_dwell_seconds` before it may flip again.
+    """
+
+    window: int = 3
+    threshold: int = 2
+    min_dwell_seconds: int = 300
+
+    @model_validator(mode="after")
+    def check_threshold(self):
+        if self.window < 1 or not 1 <= self.threshold <= self.window:
+            raise ValueError("threshold must be between 1 and window")
+        if self.min_dwell_seconds < 0:
+            raise ValueError("min_dwell_seconds must not be negative")
+        return self
+
+
+class RoomSmoothingState:
+    def __init__(self, config: SmoothingConfig):
+        self.config = config
+        self.readings: deque[bool] = deque(maxlen=config.window)
+        self.effective = False
+        self.changed_at: datetime | None = None
+        self.last_seen: datetime | None = None
+
+    def apply(self, timestamp: datetime, occupied: bool) -> bool:
+        """Feed a reading and return the effective occupancy after it"""
+        config = self.config
+        self.readings.append(occupied)
+        candidate = sum(self.readings) >= config.threshold
+
+        if candidate != self.effective and (
+            self.changed_at is None
+            or timestamp - self.changed_at
+            >= timedelta(seconds=config.min_dwell_seconds)
+        ):
+            self.effective = candidate
+            self.changed_at = timestamp
+
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+        return self.effective
+
+
+class OccupancySmoother:
+    """
+    In-memory smoothing stage deciding each room's effective occupancy.
+
+    Only readings newer than the room's last one belong in its live state; older
+    ones are smoothed separately with smooth_history(). update() must not be
+    called concurrently for the same room; /sync serializes rooms with room_locks.
+    """
+
+    def __init__(self, default_config: SmoothingConfig | None = None):
+        self.default_config = default_config or SmoothingConfig()
+        self._configs: dict[int, SmoothingConfig] = {}
+        self._states: dict[int, RoomSmoothingState] = {}
+        self._lock = Lock()
+
+    def config_for(self, room_id: int) -> SmoothingConfig:
+        return self._configs.get(room_id, self.default_config)
+
+    def set_config(self, room_id: int, config: SmoothingConfig):
+        """Override the smoothing of a room, restarting its window"""
+        with self._lock:
+            self._configs[room_id] = config
+            self._states.pop(room_id, None)
+
+    def reset_config(self, room_id: int):
+        """Return a room to the default smoothing, restarting its window"""
+        with self._lock:
+            self._configs.pop(room_id, None)
+            self._states.pop(room_id, None)
+
+    def load_configs(self, configs: dict[int, SmoothingConfig]):
+        """Replace every override, restarting the window of rooms whose config changed"""
+        with self._lock:
+            for room_id in self._configs.keys() | configs.keys():
+                if self._configs.get(room_id) != configs.get(room_id):
+                    self._states.pop(room_id, None)
+            self._configs = dict(configs)
+
+    def effective_occupancy(self, room_id: int) -> bool:
+        state = self._states.get(room_id)
+        return state.effective if state else False
+
+    def last_seen(self, room_id: int) -> datetime | None:
+        """Timestamp of the newest reading in the room's live state"""
+        state = self._states.get(room_id)
+        return state.last_seen if state else None
+
+    def update(self, room_id: int, timestamp: datetime, occupied: bool) -> bool:
+        """Feed a live raw reading and return the room's effective occupancy after it"""
+        state = self._states.get(room_id)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(
+                    room_id, RoomSmoothingState(self.config_for(room_id))
+                )
+        return state.apply(timestamp, occupied)
+
+    def smooth_history(
+        self,
+        room_id: int,
+        readings: list[tuple[datetime, bool]],
+        effective: bool = False,
+    ) -> list[bool]:
+        """
+        Effective occupancy after each of a room's past readings (in timestamp
+        order), with its configuration but without touching its live state.
+
+        `effective` is the room's state before the first reading.
+        """
+        state = RoomSmoothingState(self.config_for(room_id))
+        state.effective = effective
+        return [state.apply(timestamp, occupied) for timestamp, occupied in readings]
+
+
+smoother = OccupancySmoother()
@@ -0,0 +1,274 @@
+import json
+import os
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from pydantic import BaseModel, field_validator
+
+SLOTS_PER_DAY = 48
+SLOT_LENGTH = timedelta(minutes=30)
+DAY = timedelta(days=1)
+
+
+class DayHours(BaseModel):
+    """
+    Opening hours of one day, in minutes since midnight or "HH:MM" (close may be
+    1440 or "24:00"). A close before the open is on the next day (overnight).
+    """
+
+    open: int
+    close: int
+
+    @field_validator("open", "close", mode="before")
+    @classmethod
+    def parse_time(cls, value):
+        if isinstance(value, str) and ":" in value:
+            hours, minutes = value.split(":")
+            value = int(hours) * 60 + int(minutes)
+        if not 0 <= int(value) <= 24 * 60:
+            raise ValueError("must be between 00:00 and 24:00")
+        return value
+
+
+class BuildingSchedule(BaseModel):
+    """Weekly opening hours of a building (Monday first, None = closed) plus exceptions"""
+
+    weekly: list[DayHours | None]
+    exceptions: dict[date, DayHours | None] = {}
+
+    @field_validator("weekly")
+    @classmethod
+    def check_week(cls, weekly):
+        if len(weekly) != 7:
+            raise ValueError("weekly must have one entry per day, Monday first")
+        return weekly
+
+    def hours_on(self, day: date) -> DayHours | None:
+        if day in self.exceptions:
+            return self.exceptions[day]
+        return self.weekly[day.weekday()]
+
+
+DEFAULT_BUILDING = "Webster"
+
+# Opening hours per building (Room.building), see opening_hours.json. Exceptions
+# cover holidays (null = closed) and exam periods, e.g. 24h opening with
+# {"open": "00:00", "close": "24:00"}.
+SCHEDULES_FILE = Path(
+    os.environ.get("FOMO_OPENING_HOURS", Path(__file__).parent / "opening_hours.json")
+)
+
+
+def load_schedules(path: Path = SCHEDULES_FILE) -> dict[str, BuildingSchedule]:
+    with open(path) as f:
+        schedules = {
+            building: BuildingSchedule(**schedule)
+            for building, schedule in json.load(f).items()
+        }
+    if DEFAULT_BUILDING not in schedules:
+        raise ValueError(
+            f"No opening hours for the default building {DEFAULT_BUILDING}"
+        )
+    return schedules
+
+
+# Days compiled around the current date; days outside fall back to the schedule
+COMPILED_DAYS_BEFORE = 730
+COMPILED_DAYS_AFTER = 365
+
+
+class OpeningHoursTable:
+    """
+    Opening hours of a building compiled into per-day lookup tables.
+
+    Each compiled day holds its open/close datetimes, open minutes and a bitmap of
+    the half-hour slots it is open for, found by date ordinal in O(1). Opening times
+    are also kept sorted so the next one is found by binary search.
+    """
+
+    def __init__(self, schedule: BuildingSchedule, first_day: date, days: int):
+        self.schedule = schedule
+        self.first_ordinal = first_day.toordinal()
+        self.intervals: list[tuple[datetime, datetime] | None] = []
+        self.open_minutes: list[int] = []
+        self.slot_bitmaps: list[int] = []
+        self.openings: list[datetime] = []
+
+        previous = self._compute(first_day - DAY)
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            interval = self._compute(day)
+            self.intervals.append(interval)
+            # A day is open during its own hours and the previous day's hours past
+            # midnight
+            minutes, bitmap = self._clip(day, [previous, interval])
+            self.open_minutes.append(minutes)
+            self.slot_bitmaps.append(bitmap)
+            if interval is not None:
+                self.openings.append(interval[0])
+            previous = interval
+
+    def _compute(self, day: date) -> tuple[datetime, datetime] | None:
+        hours = self.schedule.hours_on(day)
+        if hours is None or hours.close == hours.open:
+            return None
+        midnight = datetime.combine(day, datetime.min.time())
+        close = hours.close if hours.close > hours.open else hours.close + 24 * 60
+        return (
+            midnight + timedelta(minutes=hours.open),
+            midnight + timedelta(minutes=close),
+        )
+
+    @staticmethod
+    def _clip(
+        day: date, intervals: list[tuple[datetime, datetime] | None]
+    ) -> tuple[int, int]:
+        """Open minutes and slot bitmap of the intervals within a calendar day"""
+        midnight = datetime.combine(day, datetime.min.time())
+        ranges = sorted(
+            (
+                int((max(interval[0], midnight) - midnight).total_seconds() // 60),
+                int(
+                    (min(interval[1], midnight + DAY) - midnight).total_seconds() // 60
+                ),
+            )
+            for interval in intervals
+            if interval is not None
+        )
+        minutes, bitmap, covered = 0, 0, 0
+        for open_minute, close_minute in ranges:
+            open_minute = max(open_minute, covered)
+            if open_minute >= close_minute:
+                continue
+            minutes += close_minute - open_minute
+            covered = close_minute
+            for slot in range(SLOTS_PER_DAY):
+                if open_minute <= slot * 30 and (slot + 1) * 30 <= close_minute:
+                    bitmap |= 1 << slot
+        return minutes, bitmap
+
+    def _index(self, day: date) -> int | None:
+        index = day.toordinal() - self.first_ordinal
+        return index if 0 <= index < len(self.intervals) else None
+
+    def interval_on(self, day: date) -> tuple[datetime, datetime] | None:
+        """Open and close datetimes of a day (close may be the next day), or None"""
+        index = self._index(day)
+        return self.intervals[index] if index is not None else self._compute(day)
+
+    def interval_at(self, dt: datetime) -> tuple[datetime, datetime] | None:
+        """Opening interval dt is in, possibly the previous day's past midnight"""
+        for day in (dt.date(), dt.date() - DAY):
+            interval = self.interval_on(day)
+            if interval is not None and interval[0] <= dt < interval[1]:
+                return interval
+        return None
+
+    def minutes_on(self, day: date) -> int:
+        """Minutes open within a calendar day, previous day's overnight hours included"""
+        index = self._index(day)
+        if index is not None:
+            return self.open_minutes[index]
+        minutes, _ = self._clip(day, [self._compute(day - DAY), self._compute(day)])
+        return minutes
+
+    def is_open(self, dt: datetime) -> bool:
+        return self.interval_at(dt) is not None
+
+    def is_slot_open(self, slot_start: datetime) -> bool:
+        """Whether the whole half-hour slot starting at slot_start is within hours"""
+        index = self._index(slot_start.date())
+        if index is None:
+            interval = self.interval_at(slot_start)
+            return interval is not None and slot_start + SLOT_LENGTH <= interval[1]
+        slot = (slot_start.hour * 60 + slot_start.minute) // 30
+        return bool(self.slot_bitmaps[index] >> slot & 1)
+
+    def closing_time(self, dt: datetime) -> datetime | None:
+        """
+        Closing time of the opening dt is in, else of dt's day (None if closed
+        that day)
+        """
+        interval = self.interval_at(dt) or self.interval_on(dt.date())
+        return interval[1] if interval else None
+
+    def next_opening(self, dt: datetime) -> datetime | None:
+        """First opening strictly after dt"""
+        i = bisect_right(self.openings, dt)
+        if i < len(self.openings) and self._index(dt.date()) is not None:
+            return self.openings[i]
+        day = dt.date()
+        for _ in range(366):
+            interval = self._compute(day)
+            if interval and interval[0] > dt:
+                return interval[0]
+            day += timedelta(days=1)
+        return None
+
+    def open_minutes_between(self, start: datetime, end: datetime) -> float:
+        """Minutes the building is open within [start, end)"""
+        total = 0.0
+        # The previous day's hours may reach past midnight
+        day = start.date() - DAY
+        while day <= end.date():
+            interval = self.interval_on(day)
+            if interval:
+                clipped_start = max(start, interval[0])
+                clipped_end = min(end, interval[1])
+                if clipped_start < clipped_end:
+                    total += (clipped_end - clipped_start).total_seconds() / 60
+            day += timedelta(days=1)
+        return total
+
+
+class OpeningHoursCalendar:
+    """
+    Compiled opening hours of every building, loaded from the schedules file.
+
+    refresh() reloads the file when it changed and recompiles the tables around
+    the new day when they were compiled on an earlier one.
+    """
+
+    def __init__(self, path: Path = SCHEDULES_FILE):
+        self.path = path
+        self.loaded_mtime = path.stat().st_mtime
+        self.schedules = load_schedules(path)
+        self.compile()
+
+    def compile(self):
+        """(Re)compile every building's table around today"""
+        self.compiled_on = date.today()
+        first_day = self.compiled_on - timedelta(days=COMPILED_DAYS_BEFORE)
+        days = COMPILED_DAYS_BEFORE + COMPILED_DAYS_AFTER
+        self.tables = {
+            building: OpeningHoursTable(schedule, first_day, days)
+            for building, schedule in self.schedules.items()
+        }
+
+    def refresh(self) -> bool:
+        """
+        Reload changed schedules and recompile stale tables, returning whether
+        anything was recompiled. An invalid file keeps the current schedules.
+        """
+        try:
+            mtime = self.path.stat().st_mtime
+            if mtime != self.loaded_mtime:
+                self.schedules = load_schedules(self.path)
+                self.loaded_mtime = mtime
+                print(f"Opening hours reloaded from {self.path}")
+            elif self.compiled_on == date.today():
+                return False
+        except (OSError, ValueError) as e:
+            print(f"Error loading opening hours from {self.path}:", repr(e))
+            if self.compiled_on == date.today():
+                return False
+        self.compile()
+        return True
+
+    def for_building(self, building: str | None = None) -> OpeningHoursTable:
+        """Table of a building, falling back to the default building's"""
+        return self.tables.get(building) or self.tables[DEFAULT_BUILDING]
+
+
+calendar = OpeningHoursCalendar()
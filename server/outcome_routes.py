@@ -0,0 +1,227 @@
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Annotated, Callable
+
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from models import PendingSlotOutcome, Room, SlotOutcome, SlotOutcomeType
+
+router = APIRouter(prefix="/outcomes", tags=["outcomes"])
+
+SLOT_LENGTH = timedelta(minutes=30)
+# Delay after a boundary before classifying, so heartbeats in flight land first
+CLASSIFICATION_DELAY = timedelta(seconds=5)
+# Finished slots classified after downtime, at most
+MAX_CATCH_UP = timedelta(days=1)
+
+
+class SlotOutcomeEvent(BaseModel):
+    room_id: int
+    start: datetime
+    end: datetime
+    outcome: SlotOutcomeType
+    occupied_readings: int
+
+
+class EventBus:
+    """
+    In-process publish/subscribe of slot outcome events, keeping the latest ones.
+
+    Events are published by the worker running the classification job.
+    """
+
+    def __init__(self, history: int = 500):
+        self.recent: deque[SlotOutcomeEvent] = deque(maxlen=history)
+        self._subscribers: list[Callable[[SlotOutcomeEvent], None]] = []
+
+    def subscribe(self, callback: Callable[[SlotOutcomeEvent], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, event: SlotOutcomeEvent):
+        self.recent.append(event)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print("Error in slot outcome subscriber:", e)
+
+
+events = EventBus()
+
+
+def classify(
+    reserved: bool, occupied_readings: int, open_at_start: bool
+) -> SlotOutcomeType:
+    if occupied_readings and not open_at_start:
+        return SlotOutcomeType.INTRUDED
+    if reserved:
+        return SlotOutcomeType.HONORED if occupied_readings else SlotOutcomeType.GHOST
+    return SlotOutcomeType.WALK_IN if occupied_readings else SlotOutcomeType.IDLE
+
+
+def mark_pending(session: Session, room_id: int, starts: list[datetime]):
+    """
+    Queue finished slots of a room that just received readings for
+    (re)classification, in the caller's transaction.
+    """
+    if starts:
+        session.execute(
+            sqlite_insert(PendingSlotOutcome).on_conflict_do_nothing(),
+            [{"itemId": room_id, "start": start} for start in starts],
+        )
+
+
+def finished_slots(session: Session, boundary: datetime) -> set[tuple[int, datetime]]:
+    """
+    Slots of every room ending by `boundary` that are not classified yet (at most
+    MAX_CATCH_UP back), plus the pending ones, which are removed from the queue.
+    """
+    from main import get_slot_bounds
+
+    # Deleting first takes the write lock, so readings committed after the counts
+    # are read queue their slot again
+    pending = session.execute(
+        delete(PendingSlotOutcome)
+        .where(PendingSlotOutcome.start < boundary)
+        .returning(PendingSlotOutcome.itemId, PendingSlotOutcome.start)
+    ).all()
+    slots = {(room_id, start) for room_id, start in pending}
+
+    last_classified = session.exec(select(func.max(SlotOutcome.start))).first()
+    first_start = max(
+        last_classified + SLOT_LENGTH if last_classified else boundary - SLOT_LENGTH,
+        get_slot_bounds(boundary - MAX_CATCH_UP)[0],
+    )
+    room_ids = session.exec(select(Room.id)).all()
+    start = first_start
+    while start + SLOT_LENGTH <= boundary:
+        slots.update((room_id, start) for room_id in room_ids)
+        start += SLOT_LENGTH
+    return slots
+
+
+def occupied_counts(
+    session: Session, slots: set[tuple[int, datetime]]
+) -> dict[tuple[int, datetime], int]:
+    """Occupied readings per slot, counted from the stored logs"""
+    from main import HEATMAP_LOG_MODEL as Log, slot_start_sql
+
+    slot_start = slot_start_sql(Log.timestamp)
+    statement = (
+        select(Log.itemId, slot_start, func.count())
+        .where(
+            Log.itemId.in_({room_id for room_id, _ in slots}),
+            Log.timestamp >= min(start for _, start in slots),
+            Log.timestamp < max(start for _, start in slots) + SLOT_LENGTH,
+            Log.occupied == True,
+        )
+        .group_by(Log.itemId, slot_start)
+    )
+    return {
+        (room_id, start): count
+        for room_id, start, count in session.exec(statement)
+        if (room_id, start) in slots
+    }
+
+
+def reserved_slots(
+    session: Session, slots: set[tuple[int, datetime]]
+) -> set[tuple[int, datetime]]:
+    """Which of the slots are reserved, from Slot or else their previous outcome"""
+    from main import Slot
+
+    room_ids = {room_id for room_id, _ in slots}
+    first = min(start for _, start in slots)
+    last = max(start for _, start in slots)
+
+    reserved = {}
+    statement = select(SlotOutcome.itemId, SlotOutcome.start, SlotOutcome.reserved)
+    statement = statement.where(
+        SlotOutcome.itemId.in_(room_ids),
+        SlotOutcome.start >= first,
+        SlotOutcome.start <= last,
+    )
+    for room_id, start, is_reserved in session.exec(statement):
+        reserved[(room_id, start)] = is_reserved
+    statement = select(Slot.itemId, Slot.start, Slot.reserved).where(
+        Slot.itemId.in_(room_ids), Slot.start >= first, Slot.start <= last
+    )
+    for room_id, start, is_reserved in session.exec(statement):
+        reserved[(room_id, start)] = is_reserved
+    return {key for key in slots if reserved.get(key)}
+
+
+def classify_finished_slots(session: Session, now: datetime):
+    """
+    Classify every slot that finished since the last run, plus older slots that
+    received late readings, from the stored logs and slots.
+
+    Runs as a cluster job (see main), so a single worker writes SlotOutcome.
+    """
+    from opening_hours import calendar
+
+    boundary = (now - CLASSIFICATION_DELAY).replace(second=0, microsecond=0)
+    boundary = boundary.replace(minute=(boundary.minute // 30) * 30)
+    slots = finished_slots(session, boundary)
+    if not slots:
+        session.commit()
+        return
+
+    counts = occupied_counts(session, slots)
+    reserved = reserved_slots(session, slots)
+    buildings = dict(session.exec(select(Room.id, Room.building)).all())
+
+    rows = []
+    for room_id, start in sorted(slots, key=lambda key: (key[1], key[0])):
+        hours = calendar.for_building(buildings.get(room_id))
+        occupied_readings = counts.get((room_id, start), 0)
+        is_reserved = (room_id, start) in reserved
+        rows.append(
+            {
+                "itemId": room_id,
+                "start": start,
+                "end": start + SLOT_LENGTH,
+                "reserved": is_reserved,
+                "outcome": classify(
+                    is_reserved, occupied_readings, hours.is_slot_open(start)
+                ),
+                "occupiedReadings": occupied_readings,
+            }
+        )
+
+    statement = sqlite_insert(SlotOutcome)
+    statement = statement.on_conflict_do_update(
+        index_elements=[SlotOutcome.itemId, SlotOutcome.start],
+        set_={
+            "reserved": statement.excluded.reserved,
+            "outcome": statement.excluded.outcome,
+            "occupiedReadings": statement.excluded.occupiedReadings,
+        },
+    )
+    session.execute(statement, rows)
+    session.commit()
+
+    for row in rows:
+        if row["outcome"] != SlotOutcomeType.IDLE:
+            events.publish(
+                SlotOutcomeEvent(
+                    room_id=row["itemId"],
+                    start=row["start"],
+                    end=row["end"],
+                    outcome=row["outcome"],
+                    occupied_readings=row["occupiedReadings"],
+                )
+            )
+    print(f"Classified {len(rows)} slots ending by {boundary}")
+
+
+@router.get("/events", response_model=list[SlotOutcomeEvent])
+async def get_recent_events(
+    limit: Annotated[int, Query(ge=1, le=500)] = 100,
+):
+    """Latest published slot outcome events (ghost, honored, intruded, walk-in)"""
+    return list(events.recent)[-limit:]
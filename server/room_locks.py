@@ -0,0 +1,25 @@
+from threading import Lock
+
+
+class StripedLock:
+    """
+    Fixed pool of locks shared by key (e.g. room id or device MAC).
+
+    Work on the same key is serialized and applied in order, while different keys
+    mostly map to different stripes and proceed in parallel. The pool size bounds
+    memory regardless of how many rooms or devices exist.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [Lock() for _ in range(stripes)]
+
+    def get(self, key) -> Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+
+# Serializes slot/log updates of a room across all of its units
+room_locks = StripedLock()
+
+# Serializes lookup-or-register of a device so concurrent first syncs of an
+# unknown MAC register it only once
+device_locks = StripedLock()
@@ -1,6 +1,10 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
 from sqlmodel import Session, select
+import availability_routes
+from bulk_rows import BulkResult, raise_row_errors, read_rows, validate_rows
+from fast_json import RowsResponse, select_rows
 from models import Room
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
@@ -16,6 +20,13 @@ def get_session():
 SessionDep = Depends(get_session)
 
 
+class RoomRow(BaseModel):
+    id: int
+    name: str
+    code: str
+    building: str
+
+
 @router.post("/", response_model=Room)
 async def create_room(room: Room, session=SessionDep):
     """Create a new room"""
@@ -30,13 +41,43 @@ async def create_room(room: Room, session=SessionDep):
     return room
 
 
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_upsert_rooms(request: Request, session=SessionDep):
+    """
+    Create or update rooms from a JSON array or a CSV (id,name,code,building).
+
+    All rows are validated first; if any is invalid nothing is written and the
+    errors are returned by row.
+    """
+    errors = []
+    rows = validate_rows(await read_rows(request), RoomRow, lambda r: r.id, errors)
+    raise_row_errors(errors)
+
+    ids = [row.id for _, row in rows]
+    existing = {
+        room.id: room for room in session.exec(select(Room).where(Room.id.in_(ids)))
+    }
+    for _, row in rows:
+        room = existing.get(row.id)
+        if room is None:
+            session.add(Room(**row.model_dump()))
+        else:
+            room.name = row.name
+            room.code = row.code
+            room.building = row.building
+            session.add(room)
+    session.commit()
+
+    availability_routes.rebuild_index(session)
+    return BulkResult(created=len(rows) - len(existing), updated=len(existing))
+
+
 @router.get("/", response_model=List[Room])
 async def get_all_rooms(session=SessionDep):
     """Get all rooms"""
-    statement = select(Room)
+    statement = select_rows(Room)
     results = session.exec(statement)
-    rooms = results.all()
-    return rooms
+    return RowsResponse(Room, results.all())
 
 
 @router.put("/{room_id}", response_model=Room)
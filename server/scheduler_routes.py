@@ -0,0 +1,279 @@
+import asyncio
+import inspect
+import os
+import socket
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Annotated, Awaitable, Callable
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import delete, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from models import JobRun, JobRunStatus, SchedulerLease
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker development only
+    fcntl = None
+
+router = APIRouter(prefix="/scheduler", tags=["scheduler"])
+
+LEADER_LEASE = "scheduler"
+# The leader renews its lease every tick; a crashed leader is replaced after the TTL
+LEASE_TTL = timedelta(seconds=60)
+TICK_SECONDS = 15
+# Job run history kept by the prune_job_runs job
+JOB_RUN_RETENTION = timedelta(days=30)
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on a local file, e.g. so one worker at a time initializes the DB"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        interval: timedelta,
+        func: Callable[[], None | Awaitable[None]],
+        cluster: bool,
+    ):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.cluster = cluster
+        self.last_started: datetime | None = None
+
+
+class Scheduler:
+    """
+    Periodic background jobs, safe to run in every worker of a deployment.
+
+    Cluster jobs (LibCal refresh, exports, retention) only run on the worker
+    holding the leader lease stored in the database, and are due based on the
+    run history of the whole cluster, so they run once per interval no matter
+    how many workers there are or which one leads. Local jobs refresh in-memory
+    state (indexes, forecasts) and run in every worker. Every run is recorded
+    as a JobRun with its duration and outcome.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.running: set[str] = set()
+
+    def job(self, name: str, interval: timedelta, cluster: bool = True):
+        """Register a function (sync or async, without arguments) as a periodic job"""
+
+        def register(func):
+            self.jobs[name] = Job(name, interval, func, cluster)
+            return func
+
+        return register
+
+    def renew_lease(self, session: Session, now: datetime) -> bool:
+        """Take or extend the leader lease if it is free, expired or already ours"""
+        statement = sqlite_insert(SchedulerLease).values(
+            name=LEADER_LEASE, holder=self.worker, expiresAt=now + LEASE_TTL
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[SchedulerLease.name],
+            set_={
+                "holder": statement.excluded.holder,
+                "expiresAt": statement.excluded.expiresAt,
+            },
+            where=or_(
+                SchedulerLease.holder == self.worker,
+                SchedulerLease.expiresAt < now,
+            ),
+        )
+        session.execute(statement)
+        session.commit()
+        holder = session.exec(
+            select(SchedulerLease.holder).where(SchedulerLease.name == LEADER_LEASE)
+        ).first()
+        was_leader, self.is_leader = self.is_leader, holder == self.worker
+        if self.is_leader and not was_leader:
+            print(f"Worker {self.worker} is now the scheduler leader")
+        return self.is_leader
+
+    def release_lease(self, session: Session):
+        lease = session.get(SchedulerLease, LEADER_LEASE)
+        if lease is not None and lease.holder == self.worker:
+            lease.expiresAt = datetime.now()
+            session.add(lease)
+            session.commit()
+        self.is_leader = False
+
+    def last_started(self, session: Session, job: Job) -> datetime | None:
+        if not job.cluster:
+            return job.last_started
+        statement = select(func.max(JobRun.startedAt)).where(JobRun.job == job.name)
+        return session.exec(statement).first()
+
+    def due_jobs(self, session: Session, now: datetime) -> list[Job]:
+        self.renew_lease(session, now)
+        due = []
+        for job in self.jobs.values():
+            if job.name in self.running or (job.cluster and not self.is_leader):
+                continue
+            last_started = self.last_started(session, job)
+            if last_started is None or now - last_started >= job.interval:
+                due.append(job)
+        return due
+
+    def start_run(self, session: Session, job: Job, now: datetime) -> int:
+        run = JobRun(
+            job=job.name,
+            worker=self.worker,
+            startedAt=now,
+            status=JobRunStatus.RUNNING,
+        )
+        session.add(run)
+        session.commit()
+        return run.id
+
+    def finish_run(self, session: Session, run_id: int, error: str | None):
+        run = session.get(JobRun, run_id)
+        run.finishedAt = datetime.now()
+        run.durationSeconds = (run.finishedAt - run.startedAt).total_seconds()
+        run.status = JobRunStatus.FAILED if error else JobRunStatus.SUCCEEDED
+        run.error = error
+        session.add(run)
+        session.commit()
+
+    async def run_job(self, job: Job):
+        from main import engine
+
+        now = datetime.now()
+        job.last_started = now
+        try:
+            with Session(engine) as session:
+                run_id = await run_in_threadpool(self.start_run, session, job, now)
+            error = None
+            try:
+                if inspect.iscoroutinefunction(job.func):
+                    await job.func()
+                else:
+                    await run_in_threadpool(job.func)
+            except Exception:
+                error = traceback.format_exc()
+                print(f"Error in job {job.name}:", error)
+            with Session(engine) as session:
+                await run_in_threadpool(self.finish_run, session, run_id, error)
+        finally:
+            self.running.discard(job.name)
+
+    async def run_forever(self):
+        """Start due jobs every tick, forever"""
+        from main import engine
+
+        while True:
+            try:
+                with Session(engine) as session:
+                    due = await run_in_threadpool(
+                        self.due_jobs, session, datetime.now()
+                    )
+                for job in due:
+                    self.running.add(job.name)
+                    asyncio.create_task(self.run_job(job))
+            except Exception as e:
+                print("Error in scheduler:", e)
+            await asyncio.sleep(TICK_SECONDS)
+
+
+scheduler = Scheduler()
+
+
+@scheduler.job("prune_job_runs", timedelta(days=1))
+def prune_job_runs():
+    from main import engine
+
+    with Session(engine) as session:
+        session.execute(
+            delete(JobRun).where(JobRun.startedAt < datetime.now() - JOB_RUN_RETENTION)
+        )
+        session.commit()
+
+
+class JobStatus(BaseModel):
+    name: str
+    interval_seconds: float
+    cluster: bool
+    running: bool
+    last_run: JobRun | None
+
+
+class SchedulerStatus(BaseModel):
+    worker: str
+    is_leader: bool
+    leader: str | None
+    lease_expires_at: datetime | None
+    jobs: list[JobStatus]
+
+
+@router.get("/", response_model=SchedulerStatus)
+def get_scheduler_status(session: Session = SessionDep):
+    """Leader lease and the latest run of every job (runs of this worker for local jobs)"""
+    lease = session.get(SchedulerLease, LEADER_LEASE)
+    jobs = []
+    for job in scheduler.jobs.values():
+        statement = select(JobRun).where(JobRun.job == job.name)
+        if not job.cluster:
+            statement = statement.where(JobRun.worker == scheduler.worker)
+        last_run = session.exec(statement.order_by(JobRun.startedAt.desc())).first()
+        jobs.append(
+            JobStatus(
+                name=job.name,
+                interval_seconds=job.interval.total_seconds(),
+                cluster=job.cluster,
+                running=job.name in scheduler.running,
+                last_run=last_run,
+            )
+        )
+    return SchedulerStatus(
+        worker=scheduler.worker,
+        is_leader=scheduler.is_leader,
+        leader=lease.holder if lease else None,
+        lease_expires_at=lease.expiresAt if lease else None,
+        jobs=jobs,
+    )
+
+
+@router.get("/runs", response_model=list[JobRun])
+def get_job_runs(
+    session: Session = SessionDep,
+    job: Annotated[str | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """Latest job runs across the cluster, newest first"""
+    statement = select(JobRun)
+    if job is not None:
+        statement = statement.where(JobRun.job == job)
+    return session.exec(statement.order_by(JobRun.startedAt.desc()).limit(limit)).all()
@@ -0,0 +1,96 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from models import SmoothingOverride
+from occupancy_smoothing import SmoothingConfig, smoother
+
+router = APIRouter(prefix="/smoothing", tags=["smoothing"])
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class RoomSmoothing(BaseModel):
+    room_id: int
+    config: SmoothingConfig
+    effective_occupancy: bool
+
+
+def load_overrides(session: Session):
+    """
+    Load the overrides stored in the database into the smoother, so every worker
+    (and the history import) smooths with the same configs
+    """
+    smoother.load_configs(
+        {
+            override.roomId: SmoothingConfig(
+                window=override.window,
+                threshold=override.threshold,
+                min_dwell_seconds=override.min_dwell_seconds,
+            )
+            for override in session.exec(select(SmoothingOverride)).all()
+        }
+    )
+
+
+def room_smoothing(room_id: int) -> RoomSmoothing:
+    return RoomSmoothing(
+        room_id=room_id,
+        config=smoother.config_for(room_id),
+        effective_occupancy=smoother.effective_occupancy(room_id),
+    )
+
+
+@router.get("/default", response_model=SmoothingConfig)
+async def get_default_smoothing():
+    """Get the smoothing applied to rooms without an override"""
+    return smoother.default_config
+
+
+@router.get("/{room_id}", response_model=RoomSmoothing)
+async def get_room_smoothing(room_id: int):
+    """Get a room's smoothing config and current effective occupancy"""
+    return room_smoothing(room_id)
+
+
+@router.put("/{room_id}", response_model=RoomSmoothing)
+def update_room_smoothing(
+    room_id: int,
+    config: SmoothingConfig,
+    user_id: Annotated[int, Query()],
+    session: Session = SessionDep,
+):
+    """Override a room's smoothing (restarts its smoothing window, admins only)"""
+    from analytics_routes import require_admin
+
+    require_admin(session, user_id)
+    session.merge(SmoothingOverride(roomId=room_id, **config.model_dump()))
+    session.commit()
+    smoother.set_config(room_id, config)
+    return room_smoothing(room_id)
+
+
+@router.delete("/{room_id}")
+def reset_room_smoothing(
+    room_id: int, user_id: Annotated[int, Query()], session: Session = SessionDep
+):
+    """Return a room to the default smoothing (admins only)"""
+    from analytics_routes import require_admin
+
+    require_admin(session, user_id)
+    override = session.get(SmoothingOverride, room_id)
+    if override is not None:
+        session.delete(override)
+        session.commit()
+    smoother.reset_config(room_id)
+    return {"message": f"Smoothing for room {room_id} reset to default"}
@@ -0,0 +1,196 @@
+from datetime import datetime
+from typing import Annotated, Literal
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+router = APIRouter(prefix="/timeseries", tags=["timeseries"])
+
+# Upper bound on buckets computed for one request, whatever the date range
+MAX_BUCKETS = 100_000
+
+
+def get_session():
+    from main import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+SessionDep = Depends(get_session)
+
+
+class TimeseriesPoint(BaseModel):
+    time: int  # ms since epoch, start of the bucket
+    reserved: float  # fraction of the bucket covered by reserved slots
+    occupied: float  # fraction of the bucket covered by occupied slots
+    occupancy_rate: float | None  # fraction of occupied readings, None if no readings
+    readings: int
+
+
+class Timeseries(BaseModel):
+    room_id: int
+    bucket_minutes: int
+    points: list[TimeseriesPoint]
+
+
+def to_microseconds(values: list[datetime], origin: datetime) -> np.ndarray:
+    """Convert datetimes to int64 microseconds since origin in one vectorized pass"""
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    array = np.array(values, dtype="datetime64[us]")
+    return (array - np.datetime64(origin, "us")).astype(np.int64)
+
+
+def covered_per_bucket(
+    starts: np.ndarray, ends: np.ndarray, edges: np.ndarray
+) -> np.ndarray:
+    """
+    Time covered by a set of intervals within each bucket.
+
+    Intervals must be sorted and non-overlapping (slots of one room are). The
+    cumulative covered time is evaluated at every bucket edge with a binary search,
+    so the cost is O((buckets + intervals) log intervals).
+    """
+    if len(starts) == 0:
+        return np.zeros(len(edges) - 1)
+    durations = ends - starts
+    covered_before = np.concatenate(([0], np.cumsum(durations)))
+    # Index of the last interval starting at or before each edge
+    last = np.searchsorted(starts, edges, side="right") - 1
+    clamped = np.maximum(last, 0)
+    partial = np.clip(edges - starts[clamped], 0, durations[clamped])
+    cumulative = np.where(last >= 0, covered_before[clamped] + partial, 0)
+    return np.diff(cumulative)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most `threshold` points that preserve the visual
+    shape of the series, always keeping the first and last point.
+    """
+    length = len(x)
+    if threshold >= length:
+        return np.arange(length)
+    if threshold < 3:
+        return np.array([0, length - 1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    # Buckets of the points between the first and the last one
+    bounds = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_start = end
+        next_end = bounds[i + 2] if i + 2 < len(bounds) else length
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+@router.get("/{room_id}", response_model=Timeseries)
+async def get_timeseries(
+    room_id: int,
+    start: Annotated[datetime, Query()],
+    end: Annotated[datetime, Query()],
+    bucket: Annotated[int, Query(ge=1, description="Bucket size in minutes")] = 30,
+    max_points: Annotated[
+        int | None, Query(ge=3, description="Downsample to at most this many points")
+    ] = None,
+    source: Annotated[Literal["raw", "smoothed"], Query()] = "raw",
+    session: Session = SessionDep,
+):
+    """
+    Bin a room's reservation and occupancy state into fixed buckets.
+
+    The payload is bounded by the number of buckets (and by max_points when given),
+    not by the number of slots or logs in the range.
+    """
+    from main import OCCUPANCY_LOG_SOURCES, Slot
+
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    bucket_us = bucket * 60 * 1_000_000
+    bucket_count = -(-to_microseconds([end], start)[0] // bucket_us)
+    if bucket_count > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range spans more than {MAX_BUCKETS} buckets, use a larger bucket",
+        )
+    edges = np.arange(bucket_count + 1, dtype=np.int64) * bucket_us
+
+    statement = (
+        select(Slot.start, Slot.end, Slot.reserved, Slot.occupied)
+        .where(Slot.itemId == room_id, Slot.end > start, Slot.start < end)
+        .order_by(Slot.start)
+    )
+    slot_rows = session.exec(statement).all()
+    slot_starts = to_microseconds([row[0] for row in slot_rows], start)
+    slot_ends = to_microseconds([row[1] for row in slot_rows], start)
+    reserved_mask = np.array([row[2] for row in slot_rows], dtype=bool)
+    occupied_mask = np.array([row[3] for row in slot_rows], dtype=bool)
+
+    reserved = (
+        covered_per_bucket(slot_starts[reserved_mask], slot_ends[reserved_mask], edges)
+        / bucket_us
+    )
+    occupied = (
+        covered_per_bucket(slot_starts[occupied_mask], slot_ends[occupied_mask], edges)
+        / bucket_us
+    )
+
+    log_model = OCCUPANCY_LOG_SOURCES[source]
+    statement = select(log_model.timestamp, log_model.occupied).where(
+        log_model.itemId == room_id,
+        log_model.timestamp >= start,
+        log_model.timestamp < end,
+    )
+    log_rows = session.exec(statement).all()
+    log_buckets = to_microseconds([row[0] for row in log_rows], start) // bucket_us
+    log_occupied = np.array([row[1] for row in log_rows], dtype=np.float64)
+    readings = np.bincount(log_buckets, minlength=bucket_count)
+    occupied_readings = np.bincount(
+        log_buckets, weights=log_occupied, minlength=bucket_count
+    )
+
+    times = edges[:-1]
+    indices = np.arange(bucket_count)
+    if max_points is not None and bucket_count > max_points:
+        indices = lttb_indices(
+            times.astype(np.float64), reserved + occupied, max_points
+        )
+
+    origin_ms = int(start.timestamp() * 1000)
+    return Timeseries(
+        room_id=room_id,
+        bucket_minutes=bucket,
+        points=[
+            TimeseriesPoint(
+                time=origin_ms + int(times[i]) // 1000,
+                reserved=round(float(reserved[i]), 4),
+                occupied=round(float(occupied[i]), 4),
+                occupancy_rate=(
+                    round(float(occupied_readings[i] / readings[i]), 4)
+                    if readings[i]
+                    else None
+                ),
+                readings=int(readings[i]),
+            )
+            for i in indices
+        ],
+    )
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import Session, select
+import device_limits
+import fleet_health
+from bulk_rows import (
+    BulkResult,
+    BulkRowError,
+    raise_row_errors,
+    read_rows,
+    validate_rows,
+)
+from fast_json import RowsResponse, select_rows
 from models import Unit, Room
 from pydantic import BaseModel
-from typing import Optional
+from typing import Annotated, Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/units", tags=["units"])
 
@@ -16,6 +27,13 @@ class UnitReassign(BaseModel):
     roomId: int
 
 
+class FleetHealth(BaseModel):
+    healthy: int
+    stale: int
+    dead: int
+    units: list[fleet_health.UnitStatus]
+
+
 def get_session():
     from main import engine
 
@@ -29,9 +47,81 @@ SessionDep = Depends(get_session)
 @router.get("/", response_model=list[Unit])
 async def get_all_units(session: Session = SessionDep):
     """Fetch all units"""
-    statement = select(Unit)
-    units = session.exec(statement).all()
-    return units
+    statement = select_rows(Unit)
+    return RowsResponse(Unit, session.exec(statement).all())
+
+
+@router.get("/health", response_model=FleetHealth)
+async def get_fleet_health(
+    status: Annotated[Optional[fleet_health.UnitHealth], Query()] = None,
+):
+    """Health of every unit from its last heartbeat, most overdue first"""
+    statuses = fleet_health.tracker.statuses(datetime.now())
+    counts = {health: 0 for health in fleet_health.UnitHealth}
+    for unit_status in statuses:
+        counts[unit_status.health] += 1
+    if status is not None:
+        statuses = [s for s in statuses if s.health == status]
+    statuses.sort(key=lambda s: s.last_seen)
+    return FleetHealth(
+        healthy=counts[fleet_health.UnitHealth.HEALTHY],
+        stale=counts[fleet_health.UnitHealth.STALE],
+        dead=counts[fleet_health.UnitHealth.DEAD],
+        units=statuses,
+    )
+
+
+@router.get("/quarantined", response_model=list[device_limits.QuarantinedDevice])
+async def get_quarantined_units():
+    """Devices currently quarantined for exceeding their /sync rate limit"""
+    return device_limits.heartbeats.quarantined()
+
+
+@router.delete("/quarantined/{mac_address}")
+async def release_quarantined_unit(mac_address: str):
+    """Lift a device's quarantine"""
+    if not device_limits.heartbeats.release(mac_address):
+        raise HTTPException(status_code=404, detail="Device is not quarantined")
+    return {"message": "Quarantine lifted"}
+
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_upsert_units(request: Request, session: Session = SessionDep):
+    """
+    Create units, or reassign existing ones, from a JSON array or a CSV
+    (macAddress,roomId).
+
+    All rows are validated first; if any is invalid or names an unknown room,
+    nothing is written and the errors are returned by row.
+    """
+    errors = []
+    rows = validate_rows(
+        await read_rows(request), UnitCreate, lambda r: r.macAddress, errors
+    )
+
+    room_ids = {row.roomId for _, row in rows}
+    known_rooms = set(session.exec(select(Room.id).where(Room.id.in_(room_ids))))
+    for number, row in rows:
+        if row.roomId not in known_rooms:
+            errors.append(BulkRowError(row=number, error="Room not found"))
+    raise_row_errors(errors)
+
+    mac_addresses = [row.macAddress for _, row in rows]
+    statement = select(Unit).where(Unit.macAddress.in_(mac_addresses))
+    existing = {unit.macAddress: unit for unit in session.exec(statement)}
+    for _, row in rows:
+        unit = existing.get(row.macAddress)
+        if unit is None:
+            session.add(Unit(macAddress=row.macAddress, roomId=row.roomId))
+        else:
+            unit.roomId = row.roomId
+            session.add(unit)
+    session.commit()
+
+    fleet_health.tracker.reassign(
+        {mac_address: unit.roomId for mac_address, unit in existing.items()}
+    )
+    return BulkResult(created=len(rows) - len(existing), updated=len(existing))
 
 
 @router.post("/", response_model=Unit)
@@ -80,4 +170,5 @@ async def reassign_unit(
     session.add(unit)
     session.commit()
     session.refresh(unit)
+    fleet_health.tracker.reassign({unit.macAddress: unit.roomId})
     return unit
@@ -1,6 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
+from fast_json import RowsResponse, select_rows
 from models import User, UserType
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -34,9 +35,8 @@ async def create_user(user: User, session: Session = SessionDep):
 @router.get("/", response_model=List[User])
 async def get_users(session: Session = SessionDep):
     """Get all users"""
-    statement = select(User)
-    users = session.exec(statement).all()
-    return users
+    statement = select_rows(User)
+    return RowsResponse(User, session.exec(statement).all())
 
 
 @router.get("/{user_id}", response_model=User)
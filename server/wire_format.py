@@ -0,0 +1,114 @@
+import struct
+
+import msgpack
+from fastapi import Response
+
+# Compact encodings of the room status returned to units by /sync.
+# Units opt in through the Accept header; anything else gets the regular JSON body.
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+PACKED_MEDIA_TYPE = "application/vnd.fomo.room-status"
+
+# Packed layout (little-endian), followed by the UTF-8 room name:
+# version, flags, room_id, current_time, current_reservation_ends,
+# next_reservation_starts, room name length
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct("<BBIIIIB")
+
+FLAG_CURRENTLY_RESERVED = 1 << 0
+FLAG_CURRENTLY_OPEN = 1 << 1
+FLAG_HAS_RESERVATION_END = 1 << 2
+FLAG_HAS_NEXT_RESERVATION = 1 << 3
+
+# Same order as the RoomStatus fields:
+# (room_id, room_name, current_time, currently_reserved, currently_open,
+#  current_reservation_ends, next_reservation_starts)
+RoomStatusFields = tuple[int, str, int, bool, bool, int | None, int | None]
+
+
+def pack_room_status(fields: RoomStatusFields) -> bytes:
+    """Encode a room status into the fixed-layout binary format"""
+    (
+        room_id,
+        room_name,
+        current_time,
+        currently_reserved,
+        currently_open,
+        current_reservation_ends,
+        next_reservation_starts,
+    ) = fields
+
+    flags = 0
+    if currently_reserved:
+        flags |= FLAG_CURRENTLY_RESERVED
+    if currently_open:
+        flags |= FLAG_CURRENTLY_OPEN
+    if current_reservation_ends is not None:
+        flags |= FLAG_HAS_RESERVATION_END
+    if next_reservation_starts is not None:
+        flags |= FLAG_HAS_NEXT_RESERVATION
+
+    name = room_name.encode("utf-8")[:255]
+    return (
+        PACKED_HEADER.pack(
+            PACKED_VERSION,
+            flags,
+            room_id,
+            current_time,
+            current_reservation_ends or 0,
+            next_reservation_starts or 0,
+            len(name),
+        )
+        + name
+    )
+
+
+def unpack_room_status(data: bytes) -> RoomStatusFields:
+    """Decode the fixed-layout binary format (mainly useful for tests and tooling)"""
+    (
+        version,
+        flags,
+        room_id,
+        current_time,
+        current_reservation_ends,
+        next_reservation_starts,
+        name_length,
+    ) = PACKED_HEADER.unpack_from(data)
+    if version != PACKED_VERSION:
+        raise ValueError(f"Unsupported room status version {version}")
+
+    name_start = PACKED_HEADER.size
+    room_name = data[name_start : name_start + name_length].decode("utf-8")
+    return (
+        room_id,
+        room_name,
+        current_time,
+        bool(flags & FLAG_CURRENTLY_RESERVED),
+        bool(flags & FLAG_CURRENTLY_OPEN),
+        current_reservation_ends if flags & FLAG_HAS_RESERVATION_END else None,
+        next_reservation_starts if flags & FLAG_HAS_NEXT_RESERVATION else None,
+    )
+
+
+def msgpack_room_status(fields: RoomStatusFields) -> bytes:
+    """Encode a room status as a positional msgpack array"""
+    return msgpack.packb(fields)
+
+
+def room_status_response(
+    fields: RoomStatusFields, accept: str | None
+) -> Response | None:
+    """
+    Build a compact response if the Accept header asks for one.
+
+    Returns None when the client wants JSON, so the caller can fall back to the
+    regular RoomStatus model.
+    """
+    if not accept:
+        return None
+    if PACKED_MEDIA_TYPE in accept:
+        return Response(content=pack_room_status(fields), media_type=PACKED_MEDIA_TYPE)
+    if MSGPACK_MEDIA_TYPE in accept:
+        return Response(
+            content=msgpack_room_status(fields), media_type=MSGPACK_MEDIA_TYPE
+        )
+    return None